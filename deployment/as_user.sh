@@ -18,7 +18,7 @@ function configure_directories() {
   mkdir ../data/logs
   mkdir ../data/temp
   mkdir ../data/output
-  DIRECTORIES=(bing google sites)
+  DIRECTORIES=(bing google search sites)
   for dir in ${DIRECTORIES[@]}
   do
     mkdir ../data/output/$dir
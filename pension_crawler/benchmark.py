@@ -0,0 +1,461 @@
+'''benchmark.py'''
+
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import time
+import zlib
+
+from datetime import datetime
+
+from scrapy.http import HtmlResponse
+
+from pension_crawler.sites.links import extract_links
+from pension_crawler.utils import PDFCutter, PDFReader, parse_pdf
+
+
+# corpus categories
+
+CATEGORIES = ['text', 'scanned', 'large', 'malformed']
+
+
+# words used for text pages
+
+WORDS = [
+    'pension', 'plan', 'retirement', 'system', 'annual', 'financial',
+    'report', 'fiscal', 'year', 'actuarial', 'valuation', 'funded', 'ratio',
+    'liability', 'assets', 'contribution', 'employer', 'member', 'benefit',
+    'investment', 'return', 'statement', 'net', 'position', 'fiduciary'
+]
+
+
+# 5x7 bitmap glyphs used for scanned pages
+
+GLYPHS = {
+    ' ': ['00000'] * 7,
+    'A': ['01110', '10001', '10001', '11111', '10001', '10001', '10001'],
+    'E': ['11111', '10000', '10000', '11110', '10000', '10000', '11111'],
+    'L': ['10000', '10000', '10000', '10000', '10000', '10000', '11111'],
+    'N': ['10001', '11001', '10101', '10011', '10001', '10001', '10001'],
+    'O': ['01110', '10001', '10001', '10001', '10001', '10001', '01110'],
+    'P': ['11110', '10001', '10001', '11110', '10000', '10000', '10000'],
+    'R': ['11110', '10001', '10001', '11110', '10100', '10010', '10001'],
+    'T': ['11111', '00100', '00100', '00100', '00100', '00100', '00100'],
+    'U': ['10001', '10001', '10001', '10001', '10001', '10001', '01110'],
+    '0': ['01110', '10001', '10011', '10101', '11001', '10001', '01110'],
+    '1': ['00100', '01100', '00100', '00100', '00100', '00100', '01110'],
+    '2': ['01110', '10001', '00001', '00010', '00100', '01000', '11111'],
+    '3': ['11110', '00001', '00001', '01110', '00001', '00001', '11110'],
+    '4': ['00010', '00110', '01010', '10010', '11111', '00010', '00010'],
+    '5': ['11111', '10000', '11110', '00001', '00001', '10001', '01110'],
+    '6': ['00110', '01000', '10000', '11110', '10001', '10001', '01110'],
+    '7': ['11111', '00001', '00010', '00100', '01000', '01000', '01000'],
+    '8': ['01110', '10001', '10001', '01110', '10001', '10001', '01110'],
+    '9': ['01110', '10001', '10001', '01111', '00001', '00010', '01100']
+}
+
+
+class Corpus(object):
+
+    '''Reproducible set of synthetic PDF files.'''
+
+    # constructor
+
+    def __init__(self, directory, files=20, pages=2000, seed=0,
+                 *args, **kwargs):
+        '''Set corpus directory, files per category, pages and seed.'''
+        self.directory = directory
+        self.files = files
+        self.pages = pages
+        self.seed = seed
+        self.random = random.Random(seed)
+
+    # static methods
+
+    @staticmethod
+    def _stream(dictionary, data):
+        '''Return PDF stream object.'''
+        header = b'<< %s /Length %d >>' % (dictionary, len(data))
+        return header + b'\nstream\n' + data + b'\nendstream'
+
+    @staticmethod
+    def _document(pages):
+        '''Return PDF file from list of page content and image pairs.'''
+        objects = [None, None, (
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>'
+        )]
+        kids = []
+        for content, image in pages:
+            resources = b'/Font << /F1 3 0 R >>'
+            if image:
+                width, height, data = image
+                objects.append(Corpus._stream(
+                    b'/Type /XObject /Subtype /Image /Width %d /Height %d '
+                    b'/ColorSpace /DeviceGray /BitsPerComponent 8 '
+                    b'/Filter /FlateDecode' % (width, height),
+                    zlib.compress(data)
+                ))
+                resources += b' /XObject << /Im1 %d 0 R >>' % len(objects)
+            objects.append(Corpus._stream(b'', content))
+            objects.append(
+                b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                b'/Resources << %s >> /Contents %d 0 R >>' % (
+                    resources, len(objects)
+                )
+            )
+            kids.append(b'%d 0 R' % len(objects))
+        objects[0] = b'<< /Type /Catalog /Pages 2 0 R >>'
+        objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+            b' '.join(kids), len(kids)
+        )
+        data = bytearray(b'%PDF-1.4\n')
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(len(data))
+            data += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+        xref = len(data)
+        data += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+        for offset in offsets:
+            data += b'%010d 00000 n \n' % offset
+        data += b'trailer\n<< /Size %d /Root 1 0 R >>\n' % (len(objects) + 1)
+        data += b'startxref\n%d\n%%%%EOF\n' % xref
+        return bytes(data)
+
+    @staticmethod
+    def _bitmap(text, scale=8):
+        '''Return width, height and grayscale pixels of rendered text.'''
+        margin = scale * 2
+        width = len(text) * 6 * scale + margin * 2
+        height = 7 * scale + margin * 2
+        pixels = bytearray(b'\xff' * width * height)
+        for i, char in enumerate(text):
+            for row, bits in enumerate(GLYPHS[char]):
+                for column, bit in enumerate(bits):
+                    if bit == '0':
+                        continue
+                    left = margin + (i * 6 + column) * scale
+                    top = margin + row * scale
+                    for y in range(top, top + scale):
+                        start = y * width + left
+                        pixels[start:start + scale] = b'\x00' * scale
+        return width, height, bytes(pixels)
+
+    # private methods
+
+    def _year(self):
+        '''Return random report year.'''
+        return self.random.randint(1995, 2018)
+
+    def _text(self, lines=40, year=None):
+        '''Return text page content stream.'''
+        content = [b'BT /F1 11 Tf 14 TL 56 740 Td']
+        if year:
+            content.append(
+                b'(Comprehensive Annual Financial Report %d) Tj T*' % year
+            )
+        for _ in range(lines):
+            words = self.random.sample(WORDS, 10)
+            content.append(b'(' + ' '.join(words).encode('ascii') + b') Tj T*')
+        content.append(b'ET')
+        return b'\n'.join(content)
+
+    def _scanned(self, year):
+        '''Return scanned page content stream and image.'''
+        width, height, pixels = self._bitmap('ANNUAL REPORT {}'.format(year))
+        content = b'q 540 0 0 %d 36 600 cm /Im1 Do Q' % (height * 540 // width)
+        return content, (width, height, pixels)
+
+    def _documents(self):
+        '''Yield category, file name and contents of corpus files.'''
+        for i in range(self.files):
+            pages = [(self._text(year=self._year()), None)]
+            pages += [(self._text(), None) for _ in range(i % 5)]
+            yield 'text', 'text-{:03d}.pdf'.format(i), self._document(pages)
+        for i in range(self.files):
+            pages = [self._scanned(self._year()) for _ in range(1 + i % 3)]
+            yield 'scanned', 'scanned-{:03d}.pdf'.format(i), self._document(
+                pages
+            )
+        for i in range(max(1, self.files // 10)):
+            pages = [(self._text(year=self._year()), None)]
+            pages += [(self._text(10), None) for _ in range(self.pages - 1)]
+            yield 'large', 'large-{:03d}.pdf'.format(i), self._document(pages)
+        for i in range(self.files):
+            data = self._document([(self._text(year=self._year()), None)])
+            kind = i % 4
+            if kind == 0:
+                data = data[:len(data) * 3 // 5]
+            elif kind == 1:
+                data = b'%PDF-1.4\n' + bytes(
+                    self.random.getrandbits(8) for _ in range(4096)
+                )
+            elif kind == 2:
+                data = data.replace(b'startxref\n', b'startxref\n9')
+            else:
+                data = b''
+            yield 'malformed', 'malformed-{:03d}.pdf'.format(i), data
+
+    # public methods
+
+    def build(self, force=False):
+        '''Write corpus files and return list of category and path pairs.'''
+        os.makedirs(self.directory, exist_ok=True)
+        manifest = os.path.join(self.directory, 'corpus.json')
+        settings = {
+            'files': self.files, 'pages': self.pages, 'seed': self.seed
+        }
+        if not force and os.path.exists(manifest):
+            with open(manifest) as file_:
+                data = json.load(file_)
+            if data['settings'] == settings:
+                return [tuple(entry) for entry in data['files']]
+        entries = []
+        for category, fname, data in self._documents():
+            path = os.path.join(self.directory, fname)
+            with open(path, 'wb') as file_:
+                file_.write(data)
+            entries.append((category, path))
+        with open(manifest, 'w') as file_:
+            json.dump({'settings': settings, 'files': entries}, file_)
+        return entries
+
+
+# stage functions returning number of pages processed
+
+def _cutter(path, count, temp_dir):
+    '''Cut first pages of PDF into a buffer.'''
+    with PDFCutter(path, count, temp_dir) as cutter:
+        cutter.cut()
+        cutter.buffer().close()
+        return cutter.count
+
+
+def _pypdf2(path, count, temp_dir):
+    '''Read text of first pages using PyPDF2.'''
+    with PDFCutter(path, count, temp_dir) as cutter:
+        cutter.cut()
+        reader = PDFReader(cutter, False)
+        reader.read()
+        return reader.pages_read
+
+
+def _textract(path, count, temp_dir):
+    '''Read text of first pages using Textract.'''
+    with PDFCutter(path, count, temp_dir) as cutter:
+        cutter.cut()
+        reader = PDFReader(cutter)
+        if reader._textract() is None:
+            raise ValueError('Textract failed to decode text.')
+        return cutter.count
+
+
+def _parser(path, count, temp_dir):
+    '''Parse PDF with the pipeline parser.'''
+    result = parse_pdf(path, count, temp_dir)
+    if result['page_count'] is None:
+        raise ValueError('PDF could not be parsed.')
+    return result['pages'] or 0
+
+
+STAGES = {
+    'cutter': _cutter,
+    'pypdf2': _pypdf2,
+    'textract': _textract,
+    'parser': _parser
+}
+
+
+def _peak():
+    '''Return peak resident set size of process in megabytes.'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if platform.system() == 'Darwin':
+        return peak / 1048576.0
+    return peak / 1024.0
+
+
+def _run(connection, stage, entries, count, temp_dir):
+    '''Run stage over corpus in worker process and send measurements.'''
+    function = STAGES[stage]
+    base = _peak()
+    samples = []
+    for category, path in entries:
+        start = time.perf_counter()
+        try:
+            pages = function(path, count, temp_dir)
+            error = False
+        except Exception:
+            pages = 0
+            error = True
+        samples.append((category, time.perf_counter() - start, pages, error))
+    connection.send({'samples': samples, 'base': base, 'peak': _peak()})
+    connection.close()
+
+
+def _percentile(values, percent):
+    '''Return nearest rank percentile of sorted values.'''
+    if not values:
+        return None
+    rank = max(1, int(round(percent / 100.0 * len(values))))
+    return values[min(rank, len(values)) - 1]
+
+
+def _summary(samples):
+    '''Return throughput and latency summary of stage samples.'''
+    latencies = sorted(sample[1] for sample in samples)
+    seconds = sum(latencies)
+    pages = sum(sample[2] for sample in samples)
+    summary = {
+        'files': len(samples),
+        'errors': sum(1 for sample in samples if sample[3]),
+        'pages': pages,
+        'seconds': round(seconds, 4),
+        'files_per_second': None,
+        'pages_per_second': None
+    }
+    if seconds:
+        summary['files_per_second'] = round(len(samples) / seconds, 2)
+        summary['pages_per_second'] = round(pages / seconds, 2)
+    for percent in (50, 90, 99):
+        value = _percentile(latencies, percent)
+        if value is not None:
+            value = round(value * 1000, 2)
+        summary['p{}_ms'.format(percent)] = value
+    summary['max_ms'] = round(latencies[-1] * 1000, 2) if latencies else None
+    return summary
+
+
+def run_stage(stage, entries, count, temp_dir):
+    '''Run stage in a fresh process and return its measurements.'''
+    context = multiprocessing.get_context('spawn')
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_run, args=(child, stage, entries, count, temp_dir)
+    )
+    process.start()
+    child.close()
+    try:
+        data = parent.recv()
+    except EOFError:
+        data = None
+    process.join()
+    if data is None:
+        return {'failed': True, 'exitcode': process.exitcode}
+    result = _summary(data['samples'])
+    result['base_rss_mb'] = round(data['base'], 1)
+    result['peak_rss_mb'] = round(data['peak'], 1)
+    result['categories'] = {}
+    for category in CATEGORIES:
+        samples = [
+            sample for sample in data['samples'] if sample[0] == category
+        ]
+        if samples:
+            result['categories'][category] = _summary(samples)
+    return result
+
+
+def benchmark(entries, stages, count, temp_dir):
+    '''Run stages over corpus and return results dictionary.'''
+    results = {
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'page_count': count,
+        'corpus': {
+            category: sum(1 for entry in entries if entry[0] == category)
+            for category in CATEGORIES
+        },
+        'stages': {}
+    }
+    for stage in stages:
+        results['stages'][stage] = run_stage(stage, entries, count, temp_dir)
+    return results
+
+
+# link extraction micro-benchmark
+
+def links_fixture(anchors, seed=0):
+    '''Return HTML of a document library page with many anchors.'''
+    generator = random.Random(seed)
+    rows = []
+    for i in range(anchors):
+        year = generator.randint(1995, 2018)
+        kind = i % 6
+        if kind == 0:
+            href = '../reports/{}/cafr-{}.pdf'.format(year, i)
+        elif kind == 1:
+            href = '/Documents/Valuation-{}-{}.PDF'.format(year, i)
+        elif kind == 2:
+            href = 'https://example.org/files/report-{}.Pdf?dl=1'.format(i)
+        elif kind == 3:
+            href = '../reports/{}/cafr-{}.pdf'.format(year, i - 3)
+        else:
+            href = '/about/page-{}.html'.format(i)
+        words = ' '.join(generator.sample(WORDS, 4))
+        rows.append(
+            '<tr><td><a href="{}"><span>{}</span> {}</a></td></tr>'.format(
+                href, words, year
+            )
+        )
+    return (
+        '<html><head><title>Library</title></head><body><table>{}</table>'
+        '</body></html>'.format(''.join(rows))
+    )
+
+
+def _xpath_links(response):
+    '''Return PDF links using separate XPath scans per case.'''
+    links = []
+    for query in ('//a[contains(@href,"pdf")]', '//a[contains(@href,"PDF")]'):
+        for node in response.xpath(query):
+            links.append((
+                response.urljoin(node.xpath('@href').extract_first()),
+                node.xpath('text()').extract_first()
+            ))
+    return links
+
+
+def _lxml_links(response):
+    '''Return PDF links using the sites spider link extractor.'''
+    return extract_links(response)[0]
+
+
+EXTRACTORS = {
+    'xpath': _xpath_links,
+    'lxml': _lxml_links
+}
+
+
+def bench_links(sizes, repeat=5, seed=0):
+    '''Time link extractors on parsed fixtures and return results.'''
+    results = {
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'repeat': repeat,
+        'fixtures': {}
+    }
+    for size in sizes:
+        body = links_fixture(size, seed).encode('utf-8')
+        fixture = {'bytes': len(body)}
+        for name, function in sorted(EXTRACTORS.items()):
+            latencies = []
+            for _ in range(repeat):
+                response = HtmlResponse(
+                    'http://example.org/library/index.html', body=body,
+                    encoding='utf-8'
+                )
+                response.selector
+                start = time.perf_counter()
+                links = function(response)
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+            fixture[name] = {
+                'links': len(links),
+                'p50_ms': round(_percentile(latencies, 50) * 1000, 2),
+                'min_ms': round(latencies[0] * 1000, 2),
+                'anchors_per_second': round(size / latencies[0])
+            }
+        results['fixtures'][str(size)] = fixture
+    return results
@@ -8,7 +8,7 @@ from pension_crawler.utils import CustomSettings
 
 fields = [
     'keyword', 'url', 'title', 'state', 'system', 'report_type', 'year',
-    'page_count', 'path'
+    'page_count', 'path', 'status'
 ]
 custom_settings = CustomSettings(DOWNLOAD_ENABLED, fields)
 
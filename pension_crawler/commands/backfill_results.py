@@ -0,0 +1,132 @@
+'''backfill_results.py'''
+
+import csv
+import hashlib
+import os
+
+from datetime import datetime
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from pension_crawler.stores import ResultsStore
+
+
+class Command(ScrapyCommand):
+
+    '''Import results from CSV output files into the results store.'''
+
+    # class variables
+
+    requires_project = True
+    spiders = ['google', 'bing', 'search', 'sites']
+    skipped = ('-ocr.csv', '.batched.csv')
+
+    # overriden class methods
+
+    def syntax(self):
+        '''Return command syntax.'''
+        return '[options] [output_dir ...]'
+
+    def short_desc(self):
+        '''Return command description.'''
+        return 'Import earlier CSV output files into the results store'
+
+    def add_options(self, parser):
+        '''Add checksum option.'''
+        ScrapyCommand.add_options(self, parser)
+        parser.add_option(
+            '--checksums', dest='checksums', action='store_true',
+            default=False, help='hash downloaded files still on disk'
+        )
+
+    # static methods
+
+    @staticmethod
+    def _seen(fname):
+        '''Return time of output file from its name or modification.'''
+        stem = os.path.basename(fname)[:16]
+        try:
+            return datetime.strptime(stem, '%Y-%m-%d-%H-%M').isoformat()
+        except ValueError:
+            return datetime.fromtimestamp(os.path.getmtime(fname)).isoformat()
+
+    @staticmethod
+    def _checksum(path):
+        '''Return MD5 checksum of file like the files pipeline or none.'''
+        digest = hashlib.md5()
+        try:
+            with open(path, 'rb') as file_:
+                for chunk in iter(lambda: file_.read(65536), b''):
+                    digest.update(chunk)
+        except IOError:
+            return
+        return digest.hexdigest()
+
+    # private methods
+
+    def _rows(self, fname, spider, checksums):
+        '''Return results store rows of CSV output file.'''
+        seen = self._seen(fname)
+        data_dir = self.settings.get('DATA_DIR')
+        rows = []
+        with open(fname, 'r', encoding='utf-8-sig') as file_:
+            for line in csv.DictReader(file_):
+                file_url = line.get('href') or line.get('url')
+                if not file_url:
+                    continue
+                path = line.get('path') or None
+                checksum = None
+                if path and checksums:
+                    checksum = self._checksum(os.path.join(data_dir, path))
+                rows.append({
+                    'spider': spider,
+                    'file_url': file_url,
+                    'state': line.get('state'),
+                    'system': line.get('system'),
+                    'report_type': line.get('report_type'),
+                    'url': line.get('url'),
+                    'title': line.get('title') or line.get('text'),
+                    'keyword': line.get('keyword'),
+                    'engine': line.get('engine') or None,
+                    'year': line.get('year') or None,
+                    'page_count': line.get('page_count') or None,
+                    'path': path,
+                    'checksum': checksum,
+                    'status': line.get('status') or None,
+                    'last_seen': seen
+                })
+        return rows
+
+    def run(self, args, opts):
+        '''Upsert rows of CSV output files, oldest first.'''
+        results_file = self.settings.get('RESULTS_FILE')
+        data_dir = self.settings.get('DATA_DIR')
+        if not results_file:
+            raise UsageError('RESULTS_FILE required.')
+        directories = args or [
+            os.path.join(data_dir, 'output', name) for name in self.spiders
+        ]
+        store = ResultsStore(results_file)
+        store.open()
+        total = 0
+        try:
+            for directory in directories:
+                if not os.path.isdir(directory):
+                    continue
+                spider = os.path.basename(os.path.normpath(directory))
+                for name in sorted(os.listdir(directory)):
+                    if name.endswith(self.skipped):
+                        continue
+                    if not name.endswith('.csv'):
+                        continue
+                    fname = os.path.join(directory, name)
+                    count = store.upsert(
+                        self._rows(fname, spider, opts.checksums)
+                    )
+                    total += count
+                    print('Imported {} results from {}.'.format(count, fname))
+            message = 'Results store {} holds {} results after {} imported.'
+            print(message.format(results_file, store.count(), total))
+        finally:
+            store.close()
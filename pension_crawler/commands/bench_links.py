@@ -0,0 +1,69 @@
+'''bench_links.py'''
+
+import json
+import os
+
+from datetime import datetime
+
+from scrapy.commands import ScrapyCommand
+
+from pension_crawler.benchmark import bench_links
+
+
+class Command(ScrapyCommand):
+
+    '''Benchmark sites spider link extraction on large HTML pages.'''
+
+    # class variables
+
+    requires_project = True
+
+    # overriden class methods
+
+    def syntax(self):
+        '''Return command syntax.'''
+        return '[options]'
+
+    def short_desc(self):
+        '''Return command description.'''
+        return 'Benchmark PDF link extraction on large HTML pages'
+
+    def add_options(self, parser):
+        '''Add fixture size, repeat and output options.'''
+        ScrapyCommand.add_options(self, parser)
+        parser.add_option(
+            '--sizes', dest='sizes', default='1000,10000,50000',
+            help='comma separated anchors per page'
+        )
+        parser.add_option(
+            '--repeat', dest='repeat', type='int', default=5,
+            help='runs per fixture (default: 5)'
+        )
+        parser.add_option(
+            '--output', dest='output', default=None,
+            help='results JSON file'
+        )
+
+    def run(self, args, opts):
+        '''Run link extractors on fixtures and save results.'''
+        sizes = [int(size) for size in opts.sizes.split(',') if size]
+        output = opts.output or os.path.join(
+            self.settings.get('BENCH_DIR'), 'links-{}.json'.format(
+                datetime.now().strftime('%Y-%m-%d-%H-%M')
+            )
+        )
+        results = bench_links(sizes, opts.repeat)
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as file_:
+            json.dump(results, file_, indent=2, sort_keys=True)
+        row = '{:>8} {:>8} {:>7} {:>10} {:>12}'
+        print(row.format('anchors', 'method', 'links', 'p50 ms', 'anchors/s'))
+        for size in sizes:
+            fixture = results['fixtures'][str(size)]
+            for name in ('xpath', 'lxml'):
+                result = fixture[name]
+                print(row.format(
+                    size, name, result['links'], result['p50_ms'],
+                    result['anchors_per_second']
+                ))
+        print('Results saved to {}.'.format(output))
@@ -0,0 +1,136 @@
+'''bench_pdf.py'''
+
+import json
+import os
+
+from datetime import datetime
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from pension_crawler.benchmark import STAGES, Corpus, benchmark
+
+
+class Command(ScrapyCommand):
+
+    '''Benchmark PDF extraction stages on a synthetic corpus.'''
+
+    # class variables
+
+    requires_project = True
+
+    # static methods
+
+    @staticmethod
+    def _print(results, previous=None):
+        '''Print stage results with change from previous results.'''
+        row = '{:<10} {:>6} {:>7} {:>9} {:>9} {:>9} {:>9} {:>9}'
+        print(row.format(
+            'stage', 'errors', 'files/s', 'pages/s', 'p50 ms', 'p99 ms',
+            'rss mb', 'change'
+        ))
+        for stage, result in results['stages'].items():
+            if result.get('failed'):
+                print('{:<10} failed'.format(stage))
+                continue
+            change = ''
+            try:
+                before = previous['stages'][stage]['files_per_second']
+                change = '{:+.1%}'.format(
+                    result['files_per_second'] / before - 1
+                )
+            except (KeyError, TypeError, ZeroDivisionError):
+                pass
+            print(row.format(
+                stage, result['errors'], result['files_per_second'],
+                result['pages_per_second'], result['p50_ms'],
+                result['p99_ms'], result['peak_rss_mb'], change
+            ))
+
+    # overriden class methods
+
+    def syntax(self):
+        '''Return command syntax.'''
+        return '[options]'
+
+    def short_desc(self):
+        '''Return command description.'''
+        return 'Benchmark PDF extraction on a synthetic corpus'
+
+    def long_desc(self):
+        '''Return long command description.'''
+        return (
+            'Generate a reproducible corpus of text, scanned, large and '
+            'malformed PDFs and measure throughput, latency percentiles and '
+            'peak memory of the PDF extraction stages. Every stage runs in '
+            'a new process. Results are saved as JSON.'
+        )
+
+    def add_options(self, parser):
+        '''Add corpus, stage and output options.'''
+        ScrapyCommand.add_options(self, parser)
+        parser.add_option(
+            '--corpus', dest='corpus', default=None,
+            help='corpus directory'
+        )
+        parser.add_option(
+            '--files', dest='files', type='int', default=20,
+            help='number of files per category (default: 20)'
+        )
+        parser.add_option(
+            '--pages', dest='pages', type='int', default=2000,
+            help='number of pages of large PDFs (default: 2000)'
+        )
+        parser.add_option(
+            '--seed', dest='seed', type='int', default=0,
+            help='corpus random seed (default: 0)'
+        )
+        parser.add_option(
+            '--stages', dest='stages', default=','.join(sorted(STAGES)),
+            help='comma separated stages to run'
+        )
+        parser.add_option(
+            '--output', dest='output', default=None,
+            help='results JSON file'
+        )
+        parser.add_option(
+            '--compare', dest='compare', default=None,
+            help='previous results JSON file to compare with'
+        )
+        parser.add_option(
+            '--regenerate', dest='regenerate', action='store_true',
+            help='regenerate corpus files'
+        )
+
+    def run(self, args, opts):
+        '''Build corpus, run stages and save results.'''
+        bench_dir = self.settings.get('BENCH_DIR')
+        stages = [stage for stage in opts.stages.split(',') if stage]
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            message = 'Unknown stages: {}'
+            raise UsageError(message.format(', '.join(sorted(unknown))))
+        corpus = opts.corpus or os.path.join(bench_dir, 'corpus')
+        output = opts.output or os.path.join(bench_dir, '{}.json'.format(
+            datetime.now().strftime('%Y-%m-%d-%H-%M')
+        ))
+        previous = None
+        if opts.compare:
+            with open(opts.compare) as file_:
+                previous = json.load(file_)
+        entries = Corpus(corpus, opts.files, opts.pages, opts.seed).build(
+            opts.regenerate
+        )
+        temp_dir = self.settings.get('TEMP_DIR')
+        os.makedirs(temp_dir, exist_ok=True)
+        results = benchmark(
+            entries, stages, self.settings.getint('PAGE_COUNT'), temp_dir
+        )
+        results['corpus'].update(
+            directory=corpus, seed=opts.seed, pages=opts.pages
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as file_:
+            json.dump(results, file_, indent=2, sort_keys=True)
+        self._print(results, previous)
+        print('Results saved to {}.'.format(output))
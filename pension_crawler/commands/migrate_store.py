@@ -0,0 +1,87 @@
+'''migrate_store.py'''
+
+import os
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from pension_crawler.utils import store_path
+
+
+class Command(ScrapyCommand):
+
+    '''Move downloaded files to files store layout.'''
+
+    # class variables
+
+    requires_project = True
+
+    # static methods
+
+    @staticmethod
+    def _move(basedir, layout):
+        '''Move files not stored at their layout path and return counts.'''
+        full = os.path.join(basedir, 'full')
+        moved = skipped = 0
+        for root, _, fnames in os.walk(full):
+            for fname in fnames:
+                source = os.path.join(root, fname)
+                target = os.path.join(basedir, store_path(fname, layout))
+                if source == target:
+                    skipped += 1
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(source, target)
+                moved += 1
+                if not moved % 10000:
+                    print('Moved {} files.'.format(moved))
+        return moved, skipped
+
+    @staticmethod
+    def _prune(basedir):
+        '''Remove empty directories below files store root.'''
+        full = os.path.join(basedir, 'full')
+        for root, _, _ in os.walk(full, topdown=False):
+            if root != full and not os.listdir(root):
+                os.rmdir(root)
+
+    # overriden class methods
+
+    def syntax(self):
+        '''Return command syntax.'''
+        return '[options]'
+
+    def short_desc(self):
+        '''Return command description.'''
+        return 'Move downloaded PDF files to files store layout'
+
+    def long_desc(self):
+        '''Return long command description.'''
+        return (
+            'Move downloaded PDF files in place to the layout set by '
+            'FILES_STORE_LAYOUT or --layout. Files are renamed one by one, '
+            'so an interrupted migration can be resumed by running the '
+            'command again. Do not run it while a crawl is in progress.'
+        )
+
+    def add_options(self, parser):
+        '''Add layout option.'''
+        ScrapyCommand.add_options(self, parser)
+        parser.add_option(
+            '--layout', dest='layout', default=None,
+            help='target layout: flat or sharded'
+        )
+
+    def run(self, args, opts):
+        '''Move files and remove directories left empty.'''
+        basedir = self.settings.get('FILES_STORE')
+        layout = opts.layout or self.settings.get('FILES_STORE_LAYOUT')
+        if not basedir or not os.path.isdir(basedir):
+            raise UsageError('FILES_STORE directory not found.')
+        if layout not in ('flat', 'sharded'):
+            raise UsageError('Unknown files store layout: {}'.format(layout))
+        moved, skipped = self._move(basedir, layout)
+        self._prune(basedir)
+        print('Moved {} files to {} layout, {} already in place.'.format(
+            moved, layout, skipped
+        ))
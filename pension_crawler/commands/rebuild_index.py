@@ -0,0 +1,41 @@
+'''rebuild_index.py'''
+
+import os
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from pension_crawler.stores import FileIndex
+
+
+class Command(ScrapyCommand):
+
+    '''Rebuild index of downloaded files from files store.'''
+
+    # class variables
+
+    requires_project = True
+
+    # overriden class methods
+
+    def syntax(self):
+        '''Return command syntax.'''
+        return ''
+
+    def short_desc(self):
+        '''Return command description.'''
+        return 'Rebuild index of downloaded PDF files'
+
+    def run(self, args, opts):
+        '''Scan files store and replace file index.'''
+        files_store = self.settings.get('FILES_STORE')
+        index_file = self.settings.get('FILES_INDEX_FILE')
+        if not files_store or not index_file:
+            raise UsageError('FILES_STORE and FILES_INDEX_FILE required.')
+        index = FileIndex(index_file)
+        index.open()
+        try:
+            count = index.rebuild(os.path.join(files_store, 'full'))
+        finally:
+            index.close()
+        print('Indexed {} files in {}.'.format(count, index_file))
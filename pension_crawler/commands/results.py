@@ -0,0 +1,85 @@
+'''results.py'''
+
+import csv
+import json
+import sys
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from pension_crawler.stores import ResultsStore
+
+
+class Command(ScrapyCommand):
+
+    '''Query the results store.'''
+
+    # class variables
+
+    requires_project = True
+    fields = [
+        'state', 'system', 'report_type', 'year', 'spider', 'file_url', 'path'
+    ]
+
+    # overriden class methods
+
+    def syntax(self):
+        '''Return command syntax.'''
+        return '[options]'
+
+    def short_desc(self):
+        '''Return command description.'''
+        return 'Query stored results of all spiders and runs'
+
+    def add_options(self, parser):
+        '''Add filter, latest, limit and format options.'''
+        ScrapyCommand.add_options(self, parser)
+        for name in ('spider', 'state', 'system', 'report-type', 'year',
+                     'checksum'):
+            parser.add_option(
+                '--{}'.format(name), dest=name.replace('-', '_'),
+                default=None, help='only results with this {}'.format(name)
+            )
+        parser.add_option(
+            '--latest', dest='latest', action='store_true', default=False,
+            help='only latest year per system and report type'
+        )
+        parser.add_option(
+            '--limit', dest='limit', type='int', default=None,
+            help='maximum number of results'
+        )
+        parser.add_option(
+            '--format', dest='format', default='csv',
+            help='output format, csv or json (default: csv)'
+        )
+
+    def run(self, args, opts):
+        '''Print results matching filters.'''
+        results_file = self.settings.get('RESULTS_FILE')
+        if not results_file:
+            raise UsageError('RESULTS_FILE required.')
+        if opts.format not in ('csv', 'json'):
+            raise UsageError('Unknown format: {}'.format(opts.format))
+        filters = {
+            'spider': opts.spider, 'state': opts.state,
+            'system': opts.system, 'report_type': opts.report_type,
+            'year': opts.year, 'checksum': opts.checksum
+        }
+        store = ResultsStore(results_file)
+        store.open()
+        try:
+            if opts.latest:
+                rows = store.latest(**filters)[:opts.limit]
+            else:
+                rows = store.search(opts.limit, **filters)
+        finally:
+            store.close()
+        if opts.format == 'json':
+            for row in rows:
+                print(json.dumps(row))
+            return
+        writer = csv.DictWriter(
+            sys.stdout, self.fields, extrasaction='ignore'
+        )
+        writer.writeheader()
+        writer.writerows(rows)
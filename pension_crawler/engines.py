@@ -0,0 +1,232 @@
+'''engines.py'''
+
+import logging
+
+from datetime import datetime
+from urllib.parse import urlencode
+
+from scrapy import Request
+from scrapy.exceptions import NotConfigured
+
+from pension_crawler.loaders import ResultLoader
+
+
+# logging
+
+logger = logging.getLogger(__name__)
+
+
+class SearchEngine(object):
+
+    '''Common functionality for search APIs.'''
+
+    # class variables
+
+    name = None
+    page_size = 10
+    max_results = None
+
+    # public methods
+
+    def url(self, query, row):
+        '''Return url of first results page of query.'''
+        raise NotImplementedError
+
+    def page_url(self, url, page):
+        '''Return url of results page.'''
+        raise NotImplementedError
+
+    def request(self, url, meta, callback):
+        '''Return search API request.'''
+        return Request(url, meta=meta, callback=callback)
+
+    def results(self, data):
+        '''Return result nodes of response data.'''
+        raise NotImplementedError
+
+    def total(self, data):
+        '''Return total number of results.'''
+        raise NotImplementedError
+
+    def keyword(self, data):
+        '''Return search terms of response data.'''
+        raise NotImplementedError
+
+    def item(self, node):
+        '''Load single result item.'''
+        raise NotImplementedError
+
+
+class GoogleEngine(SearchEngine):
+
+    '''Google Custom Search API.'''
+
+    # class variables
+
+    name = 'google'
+    max_results = 100
+
+    # constructor
+
+    def __init__(self, api_key, engine_id, *args, **kwargs):
+        '''Set api key and engine id.'''
+        super(GoogleEngine, self).__init__(*args, **kwargs)
+        self.api_key = api_key
+        self.engine_id = engine_id
+
+    # class methods
+
+    @classmethod
+    def from_settings(cls, settings, prefix=''):
+        '''Pass settings to constructor.'''
+        api_key = settings.get('{}API_KEY'.format(prefix))
+        engine_id = settings.get('{}ENGINE_ID'.format(prefix))
+        if not api_key:
+            raise NotConfigured('API key not specified.')
+        if not engine_id:
+            raise NotConfigured('Engine ID not specified.')
+        return cls(api_key, engine_id)
+
+    # private methods
+
+    def _date(self, text):
+        try:
+            datetime.strptime(text, '%Y%m%d')
+            return text
+        except ValueError:
+            raise NotConfigured('Invalid date: {}'.format(text))
+
+    # public methods
+
+    def url(self, query, row):
+        '''Return request url.'''
+        logger.info('Google engine - Request for query: {}'.format(query))
+        data = {'cx': self.engine_id, 'key': self.api_key, 'q': query}
+        start_date = row.get('start_date')
+        end_date = row.get('end_date')
+        if start_date and end_date:
+            data['sort'] = 'date:r:{}:{}'.format(
+                self._date(start_date), self._date(end_date)
+            )
+        base = 'https://www.googleapis.com/customsearch/v1?{}'
+        return base.format(urlencode(data))
+
+    def page_url(self, url, page):
+        '''Return url of results page.'''
+        return '{}&start={}'.format(url, page * self.page_size + 1)
+
+    def results(self, data):
+        '''Return result nodes of response data.'''
+        return data.get('items', [])
+
+    def total(self, data):
+        '''Return total number of results.'''
+        try:
+            return int(data['searchInformation']['totalResults'])
+        except (KeyError, ValueError):
+            return 0
+
+    def keyword(self, data):
+        '''Return search terms of response data.'''
+        return data['queries']['request'][0]['searchTerms']
+
+    def item(self, node):
+        '''Load single result item.'''
+        loader = ResultLoader()
+        loader.add_value('url', node['link'])
+        loader.add_value('title', node['title'])
+        loader.add_value('snippet', node['snippet'])
+        loader.add_value('timestamp', datetime.now().isoformat())
+        return loader.load_item()
+
+
+class BingEngine(SearchEngine):
+
+    '''Bing Web Search API.'''
+
+    # class variables
+
+    name = 'bing'
+
+    # constructor
+
+    def __init__(self, api_key, *args, **kwargs):
+        '''Set api key.'''
+        super(BingEngine, self).__init__(*args, **kwargs)
+        self.api_key = api_key
+
+    # class methods
+
+    @classmethod
+    def from_settings(cls, settings, prefix=''):
+        '''Pass settings to constructor.'''
+        api_key = settings.get('{}API_KEY'.format(prefix))
+        if not api_key:
+            raise NotConfigured('API key not specified.')
+        return cls(api_key)
+
+    # properties
+
+    @property
+    def headers(self):
+        '''Return request headers.'''
+        return {'Ocp-Apim-Subscription-Key': self.api_key}
+
+    # private methods
+
+    def _freshness(self, text):
+        '''Check if freshness in allowed values.'''
+        if text not in ['Day', 'Week', 'Month']:
+            raise NotConfigured('Invalid freshness: {}'.format(text))
+        return text
+
+    # public methods
+
+    def url(self, query, row):
+        '''Return request url.'''
+        logger.info('Bing engine - Request for query: {}'.format(query))
+        data = {'q': query}
+        freshness = row.get('freshness')
+        if freshness:
+            data['freshness'] = self._freshness(freshness)
+        base = 'https://api.cognitive.microsoft.com/bing/v7.0/search?{}'
+        return base.format(urlencode(data))
+
+    def page_url(self, url, page):
+        '''Return url of results page.'''
+        return '{}&count={}&offset={}'.format(
+            url, self.page_size, page * self.page_size
+        )
+
+    def request(self, url, meta, callback):
+        '''Return search API request with subscription key.'''
+        return Request(
+            url, meta=meta, callback=callback, headers=self.headers
+        )
+
+    def results(self, data):
+        '''Return result nodes of response data.'''
+        return data.get('webPages', {}).get('value', [])
+
+    def total(self, data):
+        '''Return total number of results.'''
+        return data.get('webPages', {}).get('totalEstimatedMatches', 0)
+
+    def keyword(self, data):
+        '''Return search terms of response data.'''
+        return data['queryContext']['originalQuery']
+
+    def item(self, node):
+        '''Load single result item.'''
+        loader = ResultLoader()
+        loader.add_value('url', node['url'])
+        loader.add_value('title', node['name'])
+        loader.add_value('snippet', node['snippet'])
+        loader.add_value('timestamp', datetime.now().isoformat())
+        return loader.load_item()
+
+
+ENGINES = {
+    'google': GoogleEngine,
+    'bing': BingEngine
+}
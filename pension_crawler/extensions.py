@@ -0,0 +1,280 @@
+'''extensions.py'''
+
+import bisect
+import json
+import logging
+import os
+import time
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
+from twisted.web.resource import Resource
+from twisted.web.server import Site
+
+
+# logging
+
+logger = logging.getLogger(__name__)
+
+
+# signals
+
+stage_finished = object()
+
+
+class Histogram(object):
+
+    '''Latency histogram with fixed buckets.'''
+
+    # constructor
+
+    def __init__(self, buckets, *args, **kwargs):
+        '''Set bucket upper bounds in seconds.'''
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    # public methods
+
+    def observe(self, seconds):
+        '''Add observation.'''
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def cumulative(self):
+        '''Yield bucket upper bounds with cumulative counts.'''
+        total = 0
+        for bound, count in zip(self.buckets + [None], self.counts):
+            total += count
+            yield bound, total
+
+    def quantile(self, q):
+        '''Return upper bound of bucket holding quantile.'''
+        if not self.count:
+            return 0.0
+        for bound, total in self.cumulative():
+            if total >= q * self.count:
+                return self.max if bound is None else min(bound, self.max)
+        return self.max
+
+    def summary(self, elapsed):
+        '''Return histogram summary as a dictionary.'''
+        return {
+            'count': self.count,
+            'seconds': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else 0.0,
+            'max': round(self.max, 6),
+            'p50': round(self.quantile(0.5), 6),
+            'p95': round(self.quantile(0.95), 6),
+            'rate': round(self.count / elapsed, 6) if elapsed else 0.0
+        }
+
+
+class MetricsResource(Resource):
+
+    '''Prometheus text endpoint.'''
+
+    # class variables
+
+    isLeaf = True
+
+    # constructor
+
+    def __init__(self, extension, *args, **kwargs):
+        '''Set metrics extension.'''
+        Resource.__init__(self, *args, **kwargs)
+        self.extension = extension
+
+    # overriden class methods
+
+    def render_GET(self, request):
+        '''Return metrics in Prometheus text format.'''
+        request.setHeader(b'Content-Type', b'text/plain; version=0.0.4')
+        return self.extension.prometheus().encode('utf-8')
+
+
+class MetricsExtension(object):
+
+    '''Record latency and throughput of crawl stages.
+
+    Download latencies of search API requests, file downloads and pages
+    are taken from responses. PDF parsing and CSV export stages are sent
+    by the pipelines with the stage_finished signal. Gauges are read from
+    the engine and from pipelines with a gauges property.
+    '''
+
+    # class variables
+
+    prefix = 'pension_crawler'
+
+    # constructor
+
+    def __init__(self, crawler, buckets, fname=None, interval=0, port=0,
+                 host='127.0.0.1', *args, **kwargs):
+        '''Set crawler, histogram buckets, snapshot file and endpoint.'''
+        self.crawler = crawler
+        self.buckets = sorted(buckets)
+        self.fname = fname
+        self.interval = interval
+        self.port = port
+        self.host = host
+        self.stages = {}
+        self.started = None
+        self.loop = None
+        self.listener = None
+
+    # class methods
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        '''Pass settings to constructor and connect signals.'''
+        settings = crawler.settings
+        if not settings.getbool('METRICS_ENABLED'):
+            raise NotConfigured('Metrics disabled.')
+        buckets = [float(i) for i in settings.getlist('METRICS_BUCKETS')]
+        if not buckets:
+            raise NotConfigured('Metrics buckets not specified.')
+        extension = cls(
+            crawler, buckets, settings.get('METRICS_FILE'),
+            settings.getint('METRICS_INTERVAL'),
+            settings.getint('METRICS_PORT'), settings.get('METRICS_HOST')
+        )
+        crawler.signals.connect(
+            extension.spider_opened, signal=signals.spider_opened
+        )
+        crawler.signals.connect(
+            extension.spider_closed, signal=signals.spider_closed
+        )
+        crawler.signals.connect(
+            extension.response_received, signal=signals.response_received
+        )
+        crawler.signals.connect(
+            extension.stage_finished, signal=stage_finished
+        )
+        return extension
+
+    # private methods
+
+    def _histogram(self, stage):
+        '''Return histogram of stage.'''
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram(self.buckets)
+        return histogram
+
+    def _gauges(self):
+        '''Return current values of engine and pipeline gauges.'''
+        gauges = {}
+        engine = self.crawler.engine
+        try:
+            gauges['requests_scheduled'] = len(engine.slot.scheduler)
+            gauges['downloads_active'] = len(engine.downloader.active)
+            gauges['items_active'] = len(engine.scraper.slot.active)
+            pipelines = engine.scraper.itemproc.middlewares
+        except (AttributeError, TypeError):
+            return gauges
+        for pipeline in pipelines:
+            gauges.update(getattr(pipeline, 'gauges', None) or {})
+        return gauges
+
+    def _write(self):
+        '''Write snapshot file atomically.'''
+        directory = os.path.dirname(self.fname)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp = '{}.tmp'.format(self.fname)
+        with open(temp, 'w') as file_:
+            json.dump(self.snapshot(), file_, indent=2, sort_keys=True)
+        os.replace(temp, self.fname)
+
+    def _listen(self):
+        '''Start Prometheus text endpoint.'''
+        self.listener = reactor.listenTCP(
+            self.port, Site(MetricsResource(self)), interface=self.host
+        )
+        message = 'Metrics extension - Serving metrics on {}:{}.'
+        logger.info(message.format(self.host, self.port))
+
+    # public methods
+
+    def snapshot(self):
+        '''Return stage summaries and gauges as a dictionary.'''
+        elapsed = time.time() - self.started if self.started else 0
+        return {
+            'time': time.time(),
+            'elapsed': round(elapsed, 3),
+            'stages': {
+                stage: histogram.summary(elapsed)
+                for stage, histogram in self.stages.items()
+            },
+            'gauges': self._gauges()
+        }
+
+    def prometheus(self):
+        '''Return histograms and gauges in Prometheus text format.'''
+        name = '{}_stage_seconds'.format(self.prefix)
+        lines = [
+            '# HELP {} Latency of crawl stages.'.format(name),
+            '# TYPE {} histogram'.format(name)
+        ]
+        for stage in sorted(self.stages):
+            histogram = self.stages[stage]
+            for bound, total in histogram.cumulative():
+                lines.append('{}_bucket{{stage="{}",le="{}"}} {}'.format(
+                    name, stage, '+Inf' if bound is None else bound, total
+                ))
+            lines.append('{}_sum{{stage="{}"}} {}'.format(
+                name, stage, histogram.sum
+            ))
+            lines.append('{}_count{{stage="{}"}} {}'.format(
+                name, stage, histogram.count
+            ))
+        for gauge, value in sorted(self._gauges().items()):
+            gauge = '{}_{}'.format(self.prefix, gauge)
+            lines.append('# TYPE {} gauge'.format(gauge))
+            lines.append('{} {}'.format(gauge, value))
+        return '\n'.join(lines) + '\n'
+
+    def spider_opened(self, spider):
+        '''Start snapshot loop and endpoint on signal.'''
+        self.started = time.time()
+        if self.fname and self.interval:
+            self.loop = LoopingCall(self._write)
+            self.loop.start(self.interval, now=False)
+        if self.port:
+            self._listen()
+
+    def spider_closed(self, spider, reason):
+        '''Write last snapshot and add stage summaries to stats on signal.'''
+        if self.loop and self.loop.running:
+            self.loop.stop()
+        if self.fname:
+            self._write()
+            message = 'Metrics extension - Wrote metrics to file: {}'
+            logger.info(message.format(self.fname))
+        elapsed = time.time() - self.started if self.started else 0
+        for stage, histogram in self.stages.items():
+            for key, value in histogram.summary(elapsed).items():
+                self.crawler.stats.set_value(
+                    'metrics/{}/{}'.format(stage, key), value, spider=spider
+                )
+        if self.listener:
+            return self.listener.stopListening()
+
+    def response_received(self, response, request, spider):
+        '''Record download latency of response on signal.'''
+        latency = request.meta.get('download_latency')
+        if latency is None:
+            return
+        stage = request.meta.get('metrics_stage', 'page')
+        self._histogram(stage).observe(latency)
+
+    def stage_finished(self, stage, seconds, *args, **kwargs):
+        '''Record latency of pipeline stage on signal.'''
+        self._histogram(stage).observe(seconds)
@@ -0,0 +1,112 @@
+'''httpcache.py'''
+
+import logging
+import os
+import zlib
+
+from scrapy.extensions.httpcache import DummyPolicy
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.httpobj import urlparse_cached
+from scrapy.utils.project import data_path
+from scrapy.utils.request import request_fingerprint
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
+
+from pension_crawler.stores import ResponseCache
+
+
+# logging
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteCacheStorage(object):
+
+    '''HTTP cache storage keeping compressed responses in one database.'''
+
+    # constructor
+
+    def __init__(self, settings):
+        '''Set response cache, expiration and compression level.'''
+        cache_dir = data_path(settings['HTTPCACHE_DIR'], createdir=True)
+        self.cache = ResponseCache(
+            os.path.join(cache_dir, 'cache.db'),
+            settings.getint('HTTPCACHE_SIZE')
+        )
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.level = settings.getint('HTTPCACHE_COMPRESSION_LEVEL', 6)
+
+    # overriden class methods
+
+    def open_spider(self, spider):
+        '''Open response cache and purge expired responses.'''
+        self.cache.open()
+        if self.expiration_secs > 0:
+            count = self.cache.purge(self.expiration_secs)
+            message = 'SQLite cache storage - Purged {} expired responses.'
+            logger.info(message.format(count))
+
+    def close_spider(self, spider):
+        '''Close response cache.'''
+        self.cache.close()
+
+    def retrieve_response(self, spider, request):
+        '''Return cached response or none.'''
+        row = self.cache.get(
+            spider.name, request_fingerprint(request), self.expiration_secs
+        )
+        if not row:
+            return
+        url, status, headers, body = row
+        headers = Headers(headers_raw_to_dict(zlib.decompress(headers)))
+        respcls = responsetypes.from_args(headers=headers, url=url)
+        return respcls(
+            url=url, headers=headers, status=status,
+            body=zlib.decompress(body)
+        )
+
+    def store_response(self, spider, request, response):
+        '''Compress and store response.'''
+        headers = headers_dict_to_raw(response.headers)
+        self.cache.put(
+            spider.name, request_fingerprint(request), response.url,
+            response.status, zlib.compress(headers, self.level),
+            zlib.compress(response.body, self.level)
+        )
+
+
+class NoPDFPolicy(DummyPolicy):
+
+    '''Cache policy storing all responses except PDF files and errors.'''
+
+    # class variables
+
+    error_codes = [403, 429]
+
+    # static methods
+
+    @staticmethod
+    def _pdf(request):
+        '''Return true if request url path ends with PDF extension.'''
+        return urlparse_cached(request).path.lower().endswith('.pdf')
+
+    # overriden class methods
+
+    def should_cache_request(self, request):
+        '''Skip requests for PDF files.'''
+        if self._pdf(request):
+            return False
+        return super(NoPDFPolicy, self).should_cache_request(request)
+
+    def should_cache_response(self, response, request):
+        '''Skip PDF, quota and rate limit errors and server errors.'''
+        if response.status in self.error_codes:
+            return False
+        if response.status >= 500:
+            return False
+        content_type = response.headers.get('Content-Type', b'').lower()
+        if b'pdf' in content_type or response.body[:5] == b'%PDF-':
+            return False
+        return super(NoPDFPolicy, self).should_cache_response(
+            response, request
+        )
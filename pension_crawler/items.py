@@ -12,15 +12,18 @@ class BaseItem(Item):
     report_type = Field()
     year = Field()
     page_count = Field()
+    ocr = Field()
     file_urls = Field()
     files = Field()
     timestamp = Field()
+    status = Field()
 
 
 class ResultItem(BaseItem):
 
     '''Result item.'''
 
+    engine = Field()
     keyword = Field()
     total = Field()
     url = Field()
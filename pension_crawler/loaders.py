@@ -3,7 +3,7 @@
 from scrapy.loader import ItemLoader
 from scrapy.loader.processors import TakeFirst, Identity
 
-from pension_crawler.items import ResultItem, PDFItem
+from pension_crawler.items import ResultItem
 
 
 class BaseLoader(ItemLoader):
@@ -19,10 +19,3 @@ class ResultLoader(BaseLoader):
     '''Result item loader.'''
 
     default_item_class = ResultItem
-
-
-class PDFLoader(BaseLoader):
-
-    '''PDF item loader.'''
-
-    default_item_class = PDFItem
@@ -1,11 +1,19 @@
 '''middlewares.py'''
 
+import json
 import logging
+import os
 import random
+import time
+
+from datetime import datetime
+from urllib.parse import urlparse
 
 import tldextract
 
-from scrapy.exceptions import NotConfigured, IgnoreRequest
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider, NotConfigured, IgnoreRequest
+from twisted.internet import reactor
 
 
 # logging
@@ -90,3 +98,345 @@ class UserAgentMiddleware(object):
     def process_request(self, request, *args, **kwargs):
         '''Set random user agent in request headers.'''
         request.headers.setdefault('User-Agent', self.user_agent)
+
+
+class TokenBucket(object):
+
+    '''Requests per second limit with burst capacity.'''
+
+    # constructor
+
+    def __init__(self, rate, burst=1, *args, **kwargs):
+        '''Set rate and burst capacity.'''
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = self.burst
+        self.updated = time.time()
+
+    # private methods
+
+    def _refill(self):
+        '''Add tokens for time passed since last update.'''
+        now = time.time()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    # public methods
+
+    def take(self):
+        '''Reserve token and return seconds to wait for it.'''
+        if not self.rate:
+            return 0
+        self._refill()
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / self.rate
+
+    def drain(self):
+        '''Remove available tokens.'''
+        if self.rate:
+            self._refill()
+            self.tokens = min(self.tokens, 0)
+
+
+class QuotaMiddleware(object):
+
+    '''Pace search API requests and stop them when daily quota is used.
+
+    Requests waiting for a token or a backoff are dropped from the
+    downloader and scheduled again after their delay, so they do not hold
+    concurrent request slots needed by file downloads.
+    '''
+
+    # class variables
+
+    exhausted_reasons = [
+        b'dailylimitexceeded', b'quotaexceeded', b'outofcallvolumequota'
+    ]
+    rate_reasons = [b'ratelimitexceeded']
+    interval = 5
+
+    # constructor
+
+    def __init__(self, crawler, limits, path, retry_times, backoff,
+                 backoff_max, *args, **kwargs):
+        '''Set token buckets, daily limits and quota file.'''
+        super(QuotaMiddleware, self).__init__(*args, **kwargs)
+        self.crawler = crawler
+        self.buckets = {}
+        self.daily = {}
+        for host, limit in limits.items():
+            self.buckets[host] = TokenBucket(
+                limit.get('rate', 0), limit.get('burst', 1)
+            )
+            self.daily[host] = limit.get('daily', 0)
+        self.path = path
+        self.retry_times = retry_times
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.date, self.used = self._load()
+        self.saved = 0
+        self.exhausted = set()
+        self.waiting = 0
+
+    # class methods
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        '''Pass settings to constructor and connect signals.'''
+        settings = crawler.settings
+        if not settings.getbool('QUOTA_ENABLED'):
+            raise NotConfigured('Quota middleware disabled.')
+        limits = settings.getdict('QUOTA_LIMITS')
+        path = settings.get('QUOTA_FILE')
+        if not limits:
+            raise NotConfigured('Quota limits not specified.')
+        if not path:
+            raise NotConfigured('Quota file not specified.')
+        middleware = cls(
+            crawler, limits, path, settings.getint('QUOTA_RETRY_TIMES'),
+            settings.getfloat('QUOTA_BACKOFF'),
+            settings.getfloat('QUOTA_BACKOFF_MAX'), *args, **kwargs
+        )
+        crawler.signals.connect(
+            middleware.spider_closed, signal=signals.spider_closed
+        )
+        crawler.signals.connect(
+            middleware.spider_idle, signal=signals.spider_idle
+        )
+        return middleware
+
+    # static methods
+
+    @staticmethod
+    def _today():
+        '''Return current date as text.'''
+        return datetime.now().strftime('%Y-%m-%d')
+
+    @staticmethod
+    def _host(request):
+        '''Return request host.'''
+        return urlparse(request.url).hostname
+
+    # private methods
+
+    def _load(self):
+        '''Return date and quota used per host from quota file.'''
+        try:
+            with open(self.path, 'r') as file_:
+                data = json.load(file_)
+        except (IOError, ValueError):
+            data = {}
+        if data.get('date') != self._today():
+            return self._today(), {}
+        return data['date'], data.get('used', {})
+
+    def _save(self):
+        '''Write quota used per host to quota file.'''
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp = '{}.tmp'.format(self.path)
+        with open(temp, 'w') as file_:
+            json.dump({'date': self.date, 'used': self.used}, file_)
+        os.replace(temp, self.path)
+        self.saved = time.time()
+
+    def _use(self, host):
+        '''Count request against daily quota of host.'''
+        if self.date != self._today():
+            self.date, self.used = self._today(), {}
+            self.exhausted.clear()
+        self.used[host] = self.used.get(host, 0) + 1
+        if time.time() - self.saved >= self.interval:
+            self._save()
+
+    def _available(self, host):
+        '''Return true if daily quota of host is not used up.'''
+        if host in self.exhausted and self.date == self._today():
+            return False
+        daily = self.daily[host]
+        if self.date != self._today():
+            return True
+        return not daily or self.used.get(host, 0) < daily
+
+    def _exhaust(self, host, spider):
+        '''Stop requests to host for the rest of the day.'''
+        if host in self.exhausted:
+            return
+        self.exhausted.add(host)
+        message = (
+            'Quota middleware - Daily quota for {} used up, no more '
+            'requests to it today. Closing spider.'
+        )
+        logger.warning(message.format(host))
+        self.crawler.stats.set_value(
+            'quota/exhausted/{}'.format(host), True, spider=spider
+        )
+        self.crawler.engine.close_spider(spider, 'quota_exhausted')
+
+    def _reason(self, response):
+        '''Return rate or exhausted for quota error responses or none.'''
+        if response.status == 429:
+            return 'rate'
+        if response.status != 403:
+            return
+        body = response.body.lower()
+        if any(reason in body for reason in self.exhausted_reasons):
+            return 'exhausted'
+        if any(reason in body for reason in self.rate_reasons):
+            return 'rate'
+
+    def _delay(self, response, retries):
+        '''Return seconds to wait before retrying request.'''
+        try:
+            return min(
+                self.backoff_max, float(response.headers.get('Retry-After'))
+            )
+        except (TypeError, ValueError):
+            return min(self.backoff_max, self.backoff * 2 ** retries)
+
+    def _requeue(self, request, delay, spider):
+        '''Schedule request again after delay outside the downloader.'''
+        self.waiting += 1
+        reactor.callLater(delay, self._crawl, request, spider)
+        raise IgnoreRequest('Requeued for {}s.'.format(delay))
+
+    def _crawl(self, request, spider):
+        '''Schedule delayed request.'''
+        self.waiting -= 1
+        self.crawler.engine.crawl(request, spider)
+
+    def _undelay(self, request):
+        '''Remove download delay of slot paced by a token bucket.'''
+        key = request.meta.get('download_slot')
+        slot = self.crawler.engine.downloader.slots.get(key)
+        if slot:
+            slot.delay = 0
+
+    # overriden class methods
+
+    def process_request(self, request, spider):
+        '''Wait for token of API host or ignore request if quota used.'''
+        host = self._host(request)
+        if host not in self.buckets:
+            return
+        if request.meta.pop('quota_reserved', False):
+            return
+        if not self._available(host):
+            self._exhaust(host, spider)
+            raise IgnoreRequest('Daily quota used for {}.'.format(host))
+        delay = self.buckets[host].take()
+        self._use(host)
+        if delay:
+            self.crawler.stats.inc_value('quota/delayed', spider=spider)
+            request = request.replace(dont_filter=True)
+            request.meta['quota_reserved'] = True
+            self._requeue(request, delay, spider)
+
+    def process_response(self, request, response, spider):
+        '''Retry rate limited API responses with backoff.'''
+        host = self._host(request)
+        if host not in self.buckets:
+            return response
+        if self.buckets[host].rate:
+            self._undelay(request)
+        reason = self._reason(response)
+        if reason == 'exhausted':
+            self._exhaust(host, spider)
+            raise IgnoreRequest('Daily quota used for {}.'.format(host))
+        if reason != 'rate':
+            return response
+        retries = request.meta.get('quota_retries', 0)
+        if retries >= self.retry_times:
+            message = 'Quota middleware - Gave up retrying {} after {} tries.'
+            logger.warning(message.format(request.url, retries))
+            return response
+        self.buckets[host].drain()
+        delay = self._delay(response, retries)
+        message = 'Quota middleware - Rate limited by {}, retrying in {}s.'
+        logger.info(message.format(host, delay))
+        self.crawler.stats.inc_value('quota/retries', spider=spider)
+        retry = request.replace(dont_filter=True)
+        retry.meta['quota_retries'] = retries + 1
+        self._requeue(retry, delay, spider)
+
+    def spider_idle(self, spider):
+        '''Keep spider open while delayed requests wait on signal.'''
+        if self.waiting:
+            raise DontCloseSpider()
+
+    def spider_closed(self, spider):
+        '''Write quota used on signal.'''
+        self._save()
+        message = 'Quota middleware - Quota used on {}: {}'
+        logger.info(message.format(self.date, self.used))
+
+
+class CheckpointMiddleware(object):
+
+    '''Mark input rows completed once all their requests are processed.'''
+
+    # class methods
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        '''Connect signals.'''
+        if not crawler.settings.getbool('CHECKPOINT_ENABLED'):
+            raise NotConfigured('Checkpoints disabled.')
+        middleware = cls(*args, **kwargs)
+        crawler.signals.connect(
+            middleware.request_scheduled, signal=signals.request_scheduled
+        )
+        crawler.signals.connect(
+            middleware.request_dropped, signal=signals.request_dropped
+        )
+        return middleware
+
+    # private methods
+
+    def _done(self, request, spider):
+        '''Count request as done for its input rows.'''
+        checkpoint = getattr(spider, 'checkpoint', None)
+        if checkpoint is None or request is None:
+            return
+        if not request.meta.get('checkpoint_counted'):
+            return
+        for position in request.meta.get('input_rows', []):
+            if checkpoint.finish(position):
+                spider.crawler.stats.inc_value(
+                    'input/completed', spider=spider
+                )
+
+    # public methods
+
+    def request_scheduled(self, request, spider):
+        '''Count scheduled request once for its input rows.'''
+        checkpoint = getattr(spider, 'checkpoint', None)
+        if checkpoint is None or request.meta.get('checkpoint_counted'):
+            return
+        positions = request.meta.get('input_rows')
+        if not positions:
+            return
+        request.meta['checkpoint_counted'] = True
+        for position in positions:
+            checkpoint.schedule(position)
+
+    def request_dropped(self, request, spider):
+        '''Uncount request rejected by the scheduler.'''
+        self._done(request, spider)
+
+    # overriden class methods
+
+    def process_spider_output(self, response, result, spider):
+        '''Mark request done after its callback output was consumed.'''
+        for entry in result:
+            yield entry
+        self._done(response.request, spider)
+
+    def process_spider_exception(self, response, exception, spider):
+        '''Mark request done when its callback failed.'''
+        self._done(response.request, spider)
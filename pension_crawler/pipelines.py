@@ -1,16 +1,38 @@
 '''pipelines.py'''
 
+import hashlib
+import heapq
+import itertools
+import json
 import logging
+import multiprocessing
 import os
+import re
+import time
 
 from datetime import datetime
 
+from scrapy import Request, signals
 from scrapy.exceptions import NotConfigured
 from scrapy.exporters import CsvItemExporter
-from twisted.internet import reactor
-from twisted.internet.defer import Deferred, inlineCallbacks
+from scrapy.pipelines import files
+from scrapy.settings import Settings
+from twisted.internet import reactor, threads
+from twisted.internet.task import LoopingCall
+from twisted.internet.defer import Deferred, DeferredList, inlineCallbacks
+from twisted.python.threadpool import ThreadPool
 
-from pension_crawler.utils import PDFParser
+from pension_crawler.extensions import stage_finished
+from pension_crawler.profiling import Sampler, profile_reported
+from pension_crawler.stores import (
+    ExtractionCache, FileIndex, History, JobState, ResultsStore, SeenURLs,
+    URLManifest
+)
+from pension_crawler.utils import (
+    PDFParser, PDFProcessPool, PDFWorkerError, check_pdf, parse_pdf,
+    store_path
+)
+from pension_crawler.writers import WRITERS, pyarrow, typed
 
 
 # logging
@@ -22,6 +44,42 @@ class BasePipeline(object):
 
     '''Common functionality for pipelines.'''
 
+    # static methods
+
+    @staticmethod
+    def _job_file(settings, key, fname, directory):
+        '''Return output file name of job and true if it exists already.'''
+        job = JobState.from_settings(settings)
+        if job is None:
+            return fname, False
+        job.open()
+        fname = job.setdefault(key, fname)
+        job.close()
+        path = os.path.join(directory, fname)
+        return fname, os.path.exists(path) and os.path.getsize(path) > 0
+
+    @staticmethod
+    def _mode(settings):
+        '''Return output mode, full or new.'''
+        mode = settings.get('OUTPUT_MODE') or 'full'
+        if mode not in ('full', 'new'):
+            raise NotConfigured('Unknown output mode: {}'.format(mode))
+        return mode
+
+    @staticmethod
+    def _observe(spider, stage, seconds):
+        '''Send stage latency to metrics extension.'''
+        spider.crawler.signals.send_catch_log(
+            signal=stage_finished, stage=stage, seconds=seconds,
+            spider=spider
+        )
+
+    # private methods
+
+    def _exported(self, item):
+        '''Return false for unchanged results in new output mode.'''
+        return self.mode == 'full' or item.get('status') != 'unchanged'
+
     def _path(self, item):
         '''Return path or none.'''
         try:
@@ -29,6 +87,315 @@ class BasePipeline(object):
         except IndexError:
             pass
 
+    def _checksum(self, item):
+        '''Return file content checksum or none.'''
+        try:
+            return item['files'][0]['checksum']
+        except (IndexError, KeyError):
+            pass
+
+
+class FilesPipeline(files.FilesPipeline):
+
+    '''Files pipeline with partial and conditional PDF downloads.'''
+
+    # constructor
+
+    def __init__(self, store_uri, download_func=None, settings=None):
+        '''Set partial download options and url manifest.'''
+        super(FilesPipeline, self).__init__(
+            store_uri, download_func=download_func, settings=settings
+        )
+        settings = self._settings(settings)
+        self.partial = settings.getbool('PARTIAL_DOWNLOAD_ENABLED')
+        self.manifest = None
+        if settings.getbool('FILES_MANIFEST_ENABLED'):
+            self.manifest = URLManifest(settings.get('FILES_MANIFEST_FILE'))
+        self.seen = None
+        if settings.getbool('FILES_SEEN_ENABLED'):
+            self.seen = SeenURLs(settings.get('FILES_SEEN_FILE'))
+        self.seen_expires = settings.getint('FILES_SEEN_EXPIRES') * 86400
+        if not isinstance(self.store, files.FSFilesStore):
+            self.partial = False
+            self.manifest = None
+            self.seen = None
+        self.head_size = settings.getint('PARTIAL_HEAD_SIZE')
+        self.tail_size = settings.getint('PARTIAL_TAIL_SIZE')
+        self.xref_size = settings.getint('PARTIAL_XREF_SIZE')
+        self.count = settings.getint('PAGE_COUNT')
+        self.layout = settings.get('FILES_STORE_LAYOUT', 'flat')
+        if self.layout not in ('flat', 'sharded'):
+            raise NotConfigured('Unknown files store layout.')
+
+    # static methods
+
+    @staticmethod
+    def _settings(settings):
+        '''Return settings object.'''
+        if settings is None or isinstance(settings, dict):
+            return Settings(settings)
+        return settings
+
+    @staticmethod
+    def _validators(entry):
+        '''Return true if manifest entry can revalidate its file.'''
+        if not entry:
+            return False
+        return bool(
+            entry['etag'] or entry['last_modified'] or entry['length']
+        )
+
+    @staticmethod
+    def _startxref(data):
+        '''Return offset of last cross reference table or none.'''
+        match = re.search(rb'startxref\s+(\d+)\s+%%EOF\s*$', data)
+        if match:
+            return int(match.group(1))
+
+    @staticmethod
+    def _total(response):
+        '''Return full file size from content range header or none.'''
+        value = response.headers.get('Content-Range', b'').decode('latin-1')
+        try:
+            return int(value.rsplit('/', 1)[1])
+        except (IndexError, ValueError):
+            pass
+
+    @staticmethod
+    def _header(response, name):
+        '''Return response header as text or none.'''
+        value = response.headers.get(name)
+        if value:
+            return value.decode('latin-1')
+
+    @staticmethod
+    def _length(response):
+        '''Return full file size of response or none.'''
+        total = FilesPipeline._total(response)
+        if total:
+            return total
+        try:
+            return int(response.headers.get('Content-Length'))
+        except (TypeError, ValueError):
+            return len(response.body) or None
+
+    # private methods
+
+    def _download(self, request, info):
+        '''Download request bypassing the HTTP cache.'''
+        request.meta['dont_cache'] = True
+        self._modify_media_request(request)
+        return self.crawler.engine.download(request, info.spider)
+
+    def _full(self, response, request, info):
+        '''Handle full file response.'''
+        result = super(FilesPipeline, self).media_downloaded(
+            response, request, info
+        )
+        return self._record(result, response)
+
+    def _record(self, result, response):
+        '''Store response validators and checksum in manifest.'''
+        if self.manifest:
+            self.manifest.put(
+                result['url'], self._header(response, 'ETag'),
+                self._header(response, 'Last-Modified'),
+                self._length(response), result['checksum']
+            )
+        return self._remember(result)
+
+    def _remember(self, result):
+        '''Store file path and checksum of url in seen urls.'''
+        if self.seen:
+            self.seen.put(result['url'], result['path'], result['checksum'])
+        return result
+
+    def _seen(self, request, info):
+        '''Return file result if url or its variant was downloaded before.'''
+        entry = self.seen.get(request.url, self.seen_expires)
+        if not entry:
+            return
+        path = store_path(os.path.basename(entry['path']), self.layout)
+        if not os.path.exists(os.path.join(self.store.basedir, path)):
+            return
+        message = 'Files pipeline - URL seen before: {}'
+        logger.info(message.format(request.url))
+        self.inc_stats(info.spider, 'seen')
+        return {
+            'url': request.url, 'path': path, 'checksum': entry['checksum']
+        }
+
+    def _stored(self, request, info, entry, status):
+        '''Return file result for unchanged stored file.'''
+        message = 'Files pipeline - File not modified: {}'
+        logger.info(message.format(request.url))
+        self.inc_stats(info.spider, status)
+        return self._remember({
+            'url': request.url,
+            'path': self.file_path(request, info=info),
+            'checksum': entry['checksum']
+        })
+
+    def _probe(self, response, request, info, entry):
+        '''Return stored file result if HEAD response length matches.'''
+        length = self._length(response)
+        if response.status == 200 and length == entry['length']:
+            return self._stored(request, info, entry, 'unchanged')
+
+    def _fallback(self, failure, request, info):
+        '''Download full file when partial file can not be used.'''
+        message = 'Files pipeline - Downloading full file: {}'
+        logger.info(message.format(request.url))
+        deferred = self._download(Request(request.url), info)
+        deferred.addCallback(self._full, request, info)
+        return deferred
+
+    def _tail(self, tail, head, total, request, info):
+        '''Fetch cross reference table if it is not in tail of file.'''
+        if tail.status == 200:
+            return self._full(tail, request, info)
+        if tail.status != 206 or not tail.body:
+            raise files.FileException('partial-error')
+        start = total - len(tail.body)
+        chunks = [(0, head.body), (start, tail.body)]
+        offset = self._startxref(tail.body)
+        if offset is None or offset < len(head.body) or offset >= start:
+            deferred = self._rebuild(chunks, request, info)
+        elif start - offset > self.xref_size:
+            raise files.FileException('partial-xref-too-large')
+        else:
+            xref = Request(
+                request.url,
+                headers={'Range': 'bytes={}-{}'.format(offset, start - 1)}
+            )
+            deferred = self._download(xref, info)
+            deferred.addCallback(self._xref, offset, chunks, request, info)
+        deferred.addCallback(self._record, head)
+        return deferred
+
+    def _xref(self, xref, offset, chunks, request, info):
+        '''Add cross reference table to downloaded chunks.'''
+        if xref.status != 206 or not xref.body:
+            raise files.FileException('partial-error')
+        chunks.append((offset, xref.body))
+        return self._rebuild(chunks, request, info)
+
+    def _rebuild(self, chunks, request, info):
+        '''Write downloaded chunks at their offsets and check PDF.'''
+        path = self.file_path(request, info=info)
+        absolute = os.path.join(self.store.basedir, path)
+        os.makedirs(os.path.dirname(absolute), exist_ok=True)
+        checksum = hashlib.md5()
+        with open(absolute, 'wb') as file_:
+            for offset, body in chunks:
+                file_.seek(offset)
+                file_.write(body)
+                checksum.update(body)
+        deferred = threads.deferToThread(check_pdf, absolute, self.count)
+        deferred.addCallback(
+            self._check, absolute, path, checksum.hexdigest(), request, info
+        )
+        return deferred
+
+    def _check(self, readable, absolute, path, checksum, request, info):
+        '''Return file result if partial PDF is readable.'''
+        if not readable:
+            os.remove(absolute)
+            raise files.FileException('partial-unreadable')
+        message = 'Files pipeline - Stored partial PDF: {}'
+        logger.info(message.format(path))
+        self.inc_stats(info.spider, 'partial')
+        return {'url': request.url, 'path': path, 'checksum': checksum}
+
+    # overriden class methods
+
+    def open_spider(self, spider):
+        '''Open url manifest and seen urls on signal.'''
+        super(FilesPipeline, self).open_spider(spider)
+        if self.manifest:
+            self.manifest.open()
+        if self.seen:
+            self.seen.open()
+
+    def close_spider(self, spider):
+        '''Close url manifest and seen urls on signal.'''
+        if self.manifest:
+            self.manifest.close()
+        if self.seen:
+            self.seen.close()
+
+    def _modify_media_request(self, request):
+        '''Mark file downloads for download latency metrics.'''
+        super(FilesPipeline, self)._modify_media_request(request)
+        request.meta['metrics_stage'] = 'download'
+
+    def file_path(self, request, response=None, info=None, *args, **kwargs):
+        '''Return file path for files store layout.'''
+        path = super(FilesPipeline, self).file_path(
+            request, response, info, *args, **kwargs
+        )
+        return store_path(os.path.basename(path), self.layout)
+
+    def media_to_download(self, request, info):
+        '''Revalidate files in url manifest, otherwise reuse seen urls.'''
+        entry = None
+        if self.manifest:
+            entry = self.manifest.get(request.url)
+        path = self.file_path(request, info=info)
+        if entry and not os.path.exists(
+            os.path.join(self.store.basedir, path)
+        ):
+            entry = None
+        if self.seen and not self._validators(entry):
+            result = self._seen(request, info)
+            if result:
+                return result
+        if not entry:
+            return super(FilesPipeline, self).media_to_download(
+                request, info
+            )
+        request.meta['manifest'] = entry
+        request.meta['dont_cache'] = True
+        if entry['etag']:
+            request.headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            request.headers['If-Modified-Since'] = entry['last_modified']
+        if entry['etag'] or entry['last_modified'] or not entry['length']:
+            return
+        deferred = self._download(Request(request.url, method='HEAD'), info)
+        deferred.addCallback(self._probe, request, info, entry)
+        deferred.addErrback(lambda failure: None)
+        return deferred
+
+    def get_media_requests(self, item, info):
+        '''Request only the head of files if partial download enabled.'''
+        requests = super(FilesPipeline, self).get_media_requests(item, info)
+        if not self.partial:
+            return requests
+        for request in requests:
+            request.headers['Range'] = 'bytes=0-{}'.format(self.head_size - 1)
+            request.meta['dont_cache'] = True
+        return requests
+
+    def media_downloaded(self, response, request, info):
+        '''Reuse unchanged files and fetch tail of partial responses.'''
+        entry = request.meta.get('manifest')
+        if response.status == 304 and entry:
+            return self._stored(request, info, entry, 'notmodified')
+        if response.status != 206:
+            return self._full(response, request, info)
+        total = self._total(response)
+        if not total or total <= len(response.body):
+            return self._full(response.replace(status=200), request, info)
+        tail = Request(
+            request.url,
+            headers={'Range': 'bytes=-{}'.format(self.tail_size)}
+        )
+        deferred = self._download(tail, info)
+        deferred.addCallback(self._tail, response, total, request, info)
+        deferred.addErrback(self._fallback, request, info)
+        return deferred
+
 
 class IsDownloadedPipeline(BasePipeline):
 
@@ -36,28 +403,59 @@ class IsDownloadedPipeline(BasePipeline):
 
     # constructor
 
-    def __init__(self, fnames, *args, **kwargs):
-        '''Set file names set.'''
-        self.fnames = fnames
+    def __init__(self, index, fnames_dir, job=None, *args, **kwargs):
+        '''Set file index, download directory and job state.'''
+        self.index = index
+        self.fnames_dir = fnames_dir
+        self.job = job
+        self.started = None
 
     @classmethod
     def from_crawler(cls, crawler):
         '''Pass data to constructor.'''
         fnames_dir = crawler.settings.get('FILES_STORE')
+        index_file = crawler.settings.get('FILES_INDEX_FILE')
         if not fnames_dir:
             raise NotConfigured('Download directory not specified.')
+        if not index_file:
+            raise NotConfigured('File index not specified.')
         fnames_dir = os.path.join(fnames_dir, 'full')
-        fnames = {f.split('.')[0] for f in os.listdir(fnames_dir)}
-        return cls(fnames)
+        job = JobState.from_settings(crawler.settings)
+        return cls(FileIndex(index_file), fnames_dir, job)
+
+    # overriden class methods
+
+    def open_spider(self, *args, **kwargs):
+        '''Open file index, building it on first use, on signal.'''
+        self.started = time.time()
+        if self.job:
+            self.job.open()
+            self.started = self.job.setdefault(
+                'downloaded/started', self.started
+            )
+            self.job.close()
+        new = not os.path.exists(self.index.path)
+        self.index.open()
+        if new:
+            self.index.rebuild(self.fnames_dir)
+
+    def close_spider(self, *args, **kwargs):
+        '''Close file index on signal.'''
+        self.index.close()
 
     def process_item(self, item, *args, **kwargs):
-        '''Check if PDF filen name hash is in seen hashes.'''
+        '''Check if PDF file name hash was indexed before this run.'''
         path = self._path(item)
         if not path:
             item['downloaded'] = ''
         else:
-            fname = path.split('.')[0].replace('full/', '')
-            item['downloaded'] = fname not in self.fnames
+            fname = os.path.basename(path).split('.')[0]
+            added = self.index.get(fname)
+            if added is None:
+                self.index.add(fname)
+                item['downloaded'] = True
+            else:
+                item['downloaded'] = added >= self.started
         return item
 
 
@@ -67,14 +465,46 @@ class PDFPipeline(BasePipeline):
 
     # constructor
 
-    def __init__(self, count, data_dir, temp_dir, *args, **kwargs):
-        '''Set page count and temporary directory.'''
+    def __init__(self, count, data_dir, temp_dir, stream=False, ocr=True,
+                 pool=None, cache=None, job=None, profile=None, *args,
+                 **kwargs):
+        '''Set page count, directories, read mode, pool, cache and job.'''
         self.count = count
         self.data_dir = data_dir
         self.temp_dir = temp_dir
+        self.stream = stream
+        self.ocr = ocr
+        self.pool = pool
+        self.cache = cache
+        self.job = job
+        self.profile = profile
+        self.journaled = {}
+        self.parsing = {}
+        self.dispatched = 0
+        self.threadpool = None
 
     # class methods
 
+    @classmethod
+    def _cache(cls, settings):
+        '''Return extraction cache or none if disabled.'''
+        if not settings.getbool('PDF_CACHE_ENABLED'):
+            return
+        version = '{}-{}'.format(PDFParser.version, settings.get('PAGE_COUNT'))
+        if settings.getbool('PDF_STREAM_PAGES'):
+            version = '{}-stream'.format(version)
+        return ExtractionCache(
+            settings.get('PDF_CACHE_FILE'), version,
+            settings.getint('PDF_CACHE_SIZE')
+        )
+
+    @classmethod
+    def _profile(cls, settings):
+        '''Return sampler options for PDF parses or none if disabled.'''
+        sampler = Sampler.from_settings(settings)
+        if sampler:
+            return sampler.options
+
     @classmethod
     def from_crawler(cls, crawler):
         '''Pass data to constructor.'''
@@ -85,30 +515,536 @@ class PDFPipeline(BasePipeline):
             raise NotConfigured('Page count not specified.')
         if not temp_dir:
             raise NotConfigured('Temporary directory not specified.')
-        return cls(page_count, data_dir, temp_dir)
+        stream = crawler.settings.getbool('PDF_STREAM_PAGES')
+        ocr = not crawler.settings.getbool('OCR_STAGE_ENABLED')
+        pool = None
+        if crawler.settings.getbool('PDF_POOL_ENABLED'):
+            workers = crawler.settings.getint('PDF_POOL_WORKERS')
+            timeout = crawler.settings.getint('PDF_POOL_TIMEOUT')
+            pool = PDFProcessPool(
+                workers or multiprocessing.cpu_count(), timeout
+            )
+        cache = cls._cache(crawler.settings)
+        job = JobState.from_settings(crawler.settings)
+        pipeline = cls(
+            page_count, data_dir, temp_dir, stream, ocr, pool, cache, job,
+            cls._profile(crawler.settings)
+        )
+        if job:
+            crawler.signals.connect(
+                pipeline.item_finished, signal=signals.item_scraped
+            )
+            crawler.signals.connect(
+                pipeline.item_finished, signal=signals.item_dropped
+            )
+        return pipeline
+
+    # properties
+
+    @property
+    def gauges(self):
+        '''Return PDF parses in flight for metrics extension.'''
+        return {'pdf_parses_pending': self.dispatched}
 
     # private method
 
     def _parse(self, path, deferred):
         '''Parse PDF wrapper.'''
-        parser = PDFParser(path, self.count, self.temp_dir)
-        parser.parse()
-        reactor.callFromThread(deferred.callback, (parser.year, parser.count))
+        args = (
+            path, self.count, self.temp_dir, self.stream, self.ocr,
+            self.profile
+        )
+        if not self.pool:
+            try:
+                result = parse_pdf(*args)
+            except Exception as error:
+                message = 'PDF pipeline - Failed to parse PDF {}: {!r}'
+                logger.info(message.format(path, error))
+                result = None
+        else:
+            try:
+                result = self.pool.run(parse_pdf, *args)
+            except PDFWorkerError as error:
+                message = 'PDF pipeline - Failed to parse PDF {}: {}'
+                logger.info(message.format(path, error))
+                result = None
+        reactor.callFromThread(deferred.callback, result)
+
+    def _dispatch(self, path):
+        '''Parse PDF in a thread and return deferred with results.'''
+        deferred = Deferred()
+        deferred.addBoth(self._dispatched)
+        self.dispatched += 1
+        path = os.path.join(self.data_dir, path)
+        if self.pool:
+            self.threadpool.callInThread(self._parse, path, deferred)
+        else:
+            reactor.callInThread(self._parse, path, deferred)
+        return deferred
+
+    def _dispatched(self, result):
+        '''Count finished PDF parse.'''
+        self.dispatched -= 1
+        return result
+
+    def _shared(self, path, checksum, spider):
+        '''Return deferred results of parse, joining one in flight.'''
+        if not checksum:
+            return self._dispatch(path)
+        if checksum in self.parsing:
+            message = 'PDF pipeline - Waiting for parse in flight of PDF: {}'
+            logger.info(message.format(path))
+            spider.crawler.stats.inc_value('pdf/parses_shared', spider=spider)
+            deferred = Deferred()
+            self.parsing[checksum].append(deferred)
+            return deferred
+        self.parsing[checksum] = []
+        deferred = self._dispatch(path)
+        deferred.addCallback(self._parsed, checksum)
+        return deferred
+
+    def _parsed(self, result, checksum):
+        '''Pass parse results to items waiting for the same file.'''
+        for deferred in self.parsing.pop(checksum, []):
+            deferred.callback(result)
+        return result
+
+    def _journal(self, item):
+        '''Record item with parse in flight in job state.'''
+        data = dict(item)
+        fields = dict(data)
+        fields.pop('files', None)
+        key = hashlib.sha1(json.dumps(
+            fields, sort_keys=True, default=str
+        ).encode('utf-8')).hexdigest()
+        cls = '{}.{}'.format(type(item).__module__, type(item).__name__)
+        self.job.add(key, cls, data)
+        self.journaled[id(item)] = key
+
+    def _update(self, result, item, spider):
+        '''Append parse results to item and cache them.'''
+        if not result:
+            item['year'] = None
+            item['page_count'] = None
+            return item
+        for stage, seconds in result.pop('timings', {}).items():
+            self._observe(spider, 'pdf_{}'.format(stage), seconds)
+        report = result.pop('profile', None)
+        if report:
+            spider.crawler.signals.send_catch_log(
+                signal=profile_reported, stage='PDFParser.parse',
+                report=report, spider=spider
+            )
+        spider.crawler.stats.inc_value(
+            'pdf/pages_read', result['pages'], spider=spider
+        )
+        item['year'] = result['year']
+        item['page_count'] = result['page_count']
+        if not self.ocr and not result['extractor'] and result['page_count']:
+            item['ocr'] = True
+            return item
+        checksum = self._checksum(item)
+        if self.cache and checksum:
+            self.cache.put(checksum, result)
+        return item
 
     # class method overrides
 
+    def open_spider(self, *args, **kwargs):
+        '''Open cache and job state and start process pool on signal.'''
+        if self.cache:
+            self.cache.open()
+        if self.job:
+            self.job.open()
+        if not self.pool:
+            return
+        self.pool.start()
+        self.threadpool = ThreadPool(
+            0, self.pool.workers, self.__class__.__name__
+        )
+        self.threadpool.start()
+
+    def close_spider(self, *args, **kwargs):
+        '''Close cache and job state and stop process pool on signal.'''
+        if self.cache:
+            self.cache.close()
+        if self.job:
+            self.job.close()
+        if not self.pool:
+            return
+        self.threadpool.stop()
+        self.pool.close()
+
     @inlineCallbacks
     def process_item(self, item, spider):
         '''Append results from PDF parser to item.'''
         path = self._path(item)
         if not path:
             return item
-        path = os.path.join(self.data_dir, path)
+        checksum = self._checksum(item)
+        result = None
+        if self.cache and checksum:
+            result = self.cache.get(checksum)
+        if result:
+            message = 'PDF pipeline - Using cached results for PDF: {}'
+            logger.info(message.format(path))
+            item['year'] = result['year']
+            item['page_count'] = result['page_count']
+            return item
+        if self.job:
+            self._journal(item)
+        result = yield self._shared(path, checksum, spider)
+        return self._update(result, item, spider)
+
+    # public methods
+
+    def item_finished(self, item, *args, **kwargs):
+        '''Forget journaled item once scraped or dropped on signal.'''
+        key = self.journaled.pop(id(item), None)
+        if key and self.job.connection:
+            self.job.remove(key)
+
+
+class OCRPipeline(PDFPipeline):
+
+    '''A pipeline for parsing year from PDF files without text using OCR.'''
+
+    # constructor
+
+    def __init__(self, count, data_dir, temp_dir, stream, pool, cache,
+                 output=None, append=False, profile=None, *args, **kwargs):
+        '''Set parser options, process pool, cache and sidecar file.'''
+        super(OCRPipeline, self).__init__(
+            count, data_dir, temp_dir, stream, True, pool, cache, None,
+            profile
+        )
+        self.output = output
+        self.append = append
+        self.file_ = None
+        self.exporter = None
+        self.queue = []
+        self.sequence = itertools.count()
+        self.active = 0
+        self.pending = set()
+
+    # properties
+
+    @property
+    def gauges(self):
+        '''Return queued and running OCR jobs for metrics extension.'''
+        return {'ocr_queued': len(self.queue), 'ocr_active': self.active}
+
+    # class methods
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        '''Pass data to constructor.'''
+        if not crawler.settings.getbool('OCR_STAGE_ENABLED'):
+            raise NotConfigured('OCR stage disabled.')
+        page_count = crawler.settings.get('PAGE_COUNT')
+        data_dir = crawler.settings.get('FILES_STORE')
+        temp_dir = crawler.settings.get('TEMP_DIR')
+        concurrency = crawler.settings.getint('OCR_CONCURRENCY')
+        if not page_count:
+            raise NotConfigured('Page count not specified.')
+        if not temp_dir:
+            raise NotConfigured('Temporary directory not specified.')
+        if not concurrency:
+            raise NotConfigured('OCR concurrency not specified.')
+        stream = crawler.settings.getbool('PDF_STREAM_PAGES')
+        pool = PDFProcessPool(
+            concurrency, crawler.settings.getint('OCR_TIMEOUT')
+        )
+        cache = cls._cache(crawler.settings)
+        output = None
+        append = False
+        if crawler.settings.getbool('OCR_DEFERRED'):
+            output_dir = crawler.settings.get('OUTPUT_DIR')
+            if not output_dir:
+                raise NotConfigured('Output directory not specified.')
+            fname = '{}-ocr.csv'.format(
+                datetime.now().strftime('%Y-%m-%d-%H-%M')
+            )
+            fname, append = cls._job_file(
+                crawler.settings, 'ocr/fname', fname, output_dir
+            )
+            output = os.path.join(output_dir, fname)
+        return cls(
+            page_count, data_dir, temp_dir, stream, pool, cache, output,
+            append, cls._profile(crawler.settings)
+        )
+
+    # private methods
+
+    def _enqueue(self, path, pages):
+        '''Queue OCR job, smallest PDFs first, and return its deferred.'''
+        try:
+            size = os.path.getsize(os.path.join(self.data_dir, path))
+        except OSError:
+            size = 0
         deferred = Deferred()
-        reactor.callInThread(self._parse, path, deferred)
-        year, count = yield deferred
-        item['year'] = year
-        item['page_count'] = count
+        heapq.heappush(self.queue, (
+            pages or 0, size, next(self.sequence), path, deferred
+        ))
+        self._next()
+        return deferred
+
+    def _next(self):
+        '''Start queued OCR jobs while workers are free.'''
+        while self.queue and self.active < self.pool.workers:
+            _, _, _, path, deferred = heapq.heappop(self.queue)
+            self.active += 1
+            running = self._dispatch(path)
+            running.addBoth(self._finish)
+            running.chainDeferred(deferred)
+
+    def _finish(self, result):
+        '''Free worker slot and start next queued job.'''
+        self.active -= 1
+        self._next()
+        return result
+
+    def _export(self, item):
+        '''Write OCR results to sidecar file.'''
+        urls = item.get('file_urls') or [None]
+        self.exporter.export_item({
+            'file_url': urls[0],
+            'path': self._path(item),
+            'year': item.get('year'),
+            'page_count': item.get('page_count')
+        })
+
+    def _complete(self, result, item, spider):
+        '''Update item with OCR results.'''
+        item['ocr'] = False
+        if result:
+            item = self._update(result, item, spider)
+        if self.exporter:
+            self._export(item)
+        return item
+
+    def _discard(self, result, deferred):
+        '''Forget finished deferred OCR job.'''
+        self.pending.discard(deferred)
+        return result
+
+    def _close(self, result):
+        '''Close sidecar file, cache and process pool.'''
+        super(OCRPipeline, self).close_spider()
+        if self.exporter:
+            self.exporter.finish_exporting()
+            self.file_.close()
+            message = 'OCR pipeline - Finished exporting to file: {}'
+            logger.info(message.format(self.output))
+        return result
+
+    # class method overrides
+
+    def open_spider(self, *args, **kwargs):
+        '''Start process pool and sidecar export on signal.'''
+        super(OCRPipeline, self).open_spider(*args, **kwargs)
+        if not self.output:
+            return
+        self.file_ = open(self.output, 'ab' if self.append else 'w+b')
+        self.exporter = CsvItemExporter(
+            self.file_, include_headers_line=not self.append,
+            fields_to_export=['file_url', 'path', 'year', 'page_count']
+        )
+        self.exporter.start_exporting()
+        message = 'OCR pipeline - Started exporting to file: {}'
+        logger.info(message.format(self.output))
+
+    def close_spider(self, *args, **kwargs):
+        '''Wait for deferred OCR jobs and stop on signal.'''
+        deferred = DeferredList(list(self.pending))
+        deferred.addBoth(self._close)
+        return deferred
+
+    def process_item(self, item, spider):
+        '''Queue items without PDF text for OCR.'''
+        if not item.get('ocr'):
+            return item
+        path = self._path(item)
+        message = 'OCR pipeline - Queued PDF {}, {} jobs waiting.'
+        logger.info(message.format(path, len(self.queue)))
+        deferred = self._enqueue(path, item.get('page_count'))
+        deferred.addCallback(self._complete, item, spider)
+        if not self.exporter:
+            return deferred
+        self.pending.add(deferred)
+        deferred.addBoth(self._discard, deferred)
+        return item
+
+
+class HistoryPipeline(BasePipeline):
+
+    '''Mark results as new, changed or unchanged since earlier runs.'''
+
+    # constructor
+
+    def __init__(self, history, *args, **kwargs):
+        '''Set history store.'''
+        self.history = history
+        self.started = None
+
+    # class methods
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        '''Pass data to constructor and connect signals.'''
+        settings = crawler.settings
+        if not settings.getbool('HISTORY_ENABLED'):
+            raise NotConfigured('History disabled.')
+        history_file = settings.get('HISTORY_FILE')
+        if not history_file:
+            raise NotConfigured('History file not specified.')
+        pipeline = cls(History(history_file))
+        crawler.signals.connect(
+            pipeline.item_scraped, signal=signals.item_scraped
+        )
+        return pipeline
+
+    # private methods
+
+    def _url(self, item):
+        '''Return url of result file.'''
+        urls = item.get('file_urls')
+        if urls:
+            return urls[0]
+        return item.get('href') or item.get('url')
+
+    def _status(self, item, spider):
+        '''Return status of result compared to earlier runs.'''
+        row = self.history.get(spider.name, self._url(item))
+        if row is None:
+            return 'new'
+        checksum, status, updated = row
+        if updated >= self.started:
+            return status
+        current = self._checksum(item)
+        if current and checksum and current != checksum:
+            return 'changed'
+        return 'unchanged'
+
+    # public methods
+
+    def item_scraped(self, item, spider, *args, **kwargs):
+        '''Record emitted result on signal.'''
+        if not item.get('status') or not self._url(item):
+            return
+        self.history.put(
+            spider.name, self._url(item), self._checksum(item),
+            item['status']
+        )
+
+    # overriden class methods
+
+    def open_spider(self, *args, **kwargs):
+        '''Open history store on signal.'''
+        self.started = time.time()
+        self.history.open()
+
+    def close_spider(self, *args, **kwargs):
+        '''Close history store on signal.'''
+        self.history.close()
+
+    def process_item(self, item, spider):
+        '''Set status of result.'''
+        if not self._url(item):
+            return item
+        item['status'] = self._status(item, spider)
+        spider.crawler.stats.inc_value(
+            'history/{}'.format(item['status']), spider=spider
+        )
+        return item
+
+
+class ResultsPipeline(BasePipeline):
+
+    '''Upsert results into the results store in batches.'''
+
+    # constructor
+
+    def __init__(self, store, batch_size, interval, *args, **kwargs):
+        '''Set results store and flush triggers.'''
+        self.store = store
+        self.batch_size = batch_size
+        self.interval = interval
+        self.rows = []
+        self.loop = None
+
+    # class methods
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        '''Pass data to constructor.'''
+        settings = crawler.settings
+        if not settings.getbool('RESULTS_ENABLED'):
+            raise NotConfigured('Results store disabled.')
+        results_file = settings.get('RESULTS_FILE')
+        if not results_file:
+            raise NotConfigured('Results file not specified.')
+        return cls(
+            ResultsStore(results_file), settings.getint('RESULTS_BATCH_SIZE'),
+            settings.getfloat('RESULTS_FLUSH_INTERVAL')
+        )
+
+    # private methods
+
+    def _row(self, item, spider):
+        '''Return results store row of item.'''
+        urls = item.get('file_urls') or [item.get('href') or item.get('url')]
+        path = self._path(item)
+        return {
+            'spider': spider.name,
+            'file_url': urls[0],
+            'state': item.get('state'),
+            'system': item.get('system'),
+            'report_type': item.get('report_type'),
+            'url': item.get('url'),
+            'title': item.get('title') or item.get('text'),
+            'keyword': item.get('keyword'),
+            'engine': item.get('engine'),
+            'year': item.get('year'),
+            'page_count': item.get('page_count'),
+            'path': os.path.join('downloads', path) if path else None,
+            'checksum': self._checksum(item),
+            'status': item.get('status'),
+            'last_seen': item.get('timestamp') or datetime.now().isoformat()
+        }
+
+    def _flush(self):
+        '''Write buffered rows in one transaction.'''
+        if not self.rows:
+            return
+        rows, self.rows = self.rows, []
+        self.store.upsert(rows)
+        message = 'Results pipeline - Stored {} results.'
+        logger.debug(message.format(len(rows)))
+
+    # overriden class methods
+
+    def open_spider(self, *args, **kwargs):
+        '''Open results store and start flushing on an interval.'''
+        self.store.open()
+        if self.interval:
+            self.loop = LoopingCall(self._flush)
+            self.loop.start(self.interval, now=False)
+
+    def close_spider(self, *args, **kwargs):
+        '''Store remaining rows and close results store on signal.'''
+        if self.loop and self.loop.running:
+            self.loop.stop()
+        self._flush()
+        self.store.close()
+
+    def process_item(self, item, spider):
+        '''Buffer result and store a batch once full.'''
+        if not item.get('file_urls') and not item.get('url'):
+            return item
+        self.rows.append(self._row(item, spider))
+        if len(self.rows) >= self.batch_size:
+            self._flush()
         return item
 
 
@@ -118,11 +1054,18 @@ class CSVPipeline(BasePipeline):
 
     # constructor
 
-    def __init__(self, output_dir, fname, fields, *args, **kwargs):
-        '''Set output file object and CSV exporter.'''
+    def __init__(self, output_dir, fname, fields, append=False, mode='full',
+                 *args, **kwargs):
+        '''Set output file object, CSV exporter and output mode.'''
         self.fname = fname
-        self.file_ = open(os.path.join(output_dir, fname), 'w+b')
-        self.exporter = CsvItemExporter(self.file_, fields_to_export=fields)
+        self.mode = mode
+        self.file_ = open(
+            os.path.join(output_dir, fname), 'ab' if append else 'w+b'
+        )
+        self.exporter = CsvItemExporter(
+            self.file_, include_headers_line=not append,
+            fields_to_export=fields
+        )
 
     # class methods
 
@@ -136,7 +1079,14 @@ class CSVPipeline(BasePipeline):
         if not fields_to_export:
             raise NotConfigured('Fields to export not specified.')
         fname = '{}.csv'.format(datetime.now().strftime('%Y-%m-%d-%H-%M'))
-        return cls(output_dir, fname, fields_to_export, *args, **kwargs)
+        fname, append = cls._job_file(
+            crawler.settings, 'csv/fname', fname, output_dir
+        )
+        mode = cls._mode(crawler.settings)
+        return cls(
+            output_dir, fname, fields_to_export, append, mode, *args,
+            **kwargs
+        )
 
     # private methods
 
@@ -168,7 +1118,130 @@ class CSVPipeline(BasePipeline):
         message = 'CSV pipeline - Finished exporting to file: {}'
         logger.info(message.format(self.fname))
 
-    def process_item(self, item, *args, **kwargs):
+    def process_item(self, item, spider):
         '''Export item to csv file and return item.'''
-        self._export(item)
+        if self._exported(item):
+            started = time.perf_counter()
+            self._export(item)
+            self._observe(spider, 'csv_export', time.perf_counter() - started)
+        return item
+
+
+class OutputPipeline(BasePipeline):
+
+    '''Export items in batches to CSV, JSON Lines, Arrow or Parquet.'''
+
+    # constructor
+
+    def __init__(self, writers, fields, batch_size, interval, append=False,
+                 mode='full', *args, **kwargs):
+        '''Set output writers, columns, flush triggers and output mode.'''
+        self.writers = writers
+        self.mode = mode
+        self.fields = fields
+        self.batch_size = batch_size
+        self.interval = interval
+        self.append = append
+        self.rows = []
+        self.loop = None
+        self.stats = None
+
+    # class methods
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        '''Pass data to constructor.'''
+        settings = crawler.settings
+        formats = settings.getlist('OUTPUT_FORMATS')
+        output_dir = settings.get('OUTPUT_DIR')
+        fields = settings.get('FIELDS_TO_EXPORT')
+        if not formats:
+            raise NotConfigured('Output formats not specified.')
+        if not output_dir:
+            raise NotConfigured('Output directory not specified.')
+        if not fields:
+            raise NotConfigured('Fields to export not specified.')
+        for name in formats:
+            if name not in WRITERS:
+                raise NotConfigured('Unknown output format: {}'.format(name))
+            if name in ('arrow', 'parquet') and pyarrow is None:
+                raise NotConfigured(
+                    'pyarrow is required for {} output.'.format(name)
+                )
+        fname = '{}.batched'.format(datetime.now().strftime('%Y-%m-%d-%H-%M'))
+        fname, _ = cls._job_file(settings, 'output/fname', fname, output_dir)
+        path = os.path.join(output_dir, fname)
+        append = bool(settings.get('JOBDIR'))
+        writers = []
+        for name in formats:
+            writer = WRITERS[name](path, fields)
+            if append and not writer.appendable and (
+                os.path.exists(writer.path)
+            ):
+                writer = WRITERS[name](
+                    '{}-{}'.format(path, int(time.time())), fields
+                )
+            writers.append(writer)
+        pipeline = cls(
+            writers, fields, settings.getint('OUTPUT_BATCH_SIZE'),
+            settings.getfloat('OUTPUT_FLUSH_INTERVAL'), append,
+            cls._mode(settings), *args, **kwargs
+        )
+        pipeline.stats = crawler.stats
+        return pipeline
+
+    # private methods
+
+    def _row(self, item):
+        '''Return typed output row of item.'''
+        row = {}
+        for key in self.fields:
+            if key == 'path':
+                path = self._path(item)
+                if path:
+                    path = os.path.join('downloads', path)
+                row['path'] = path
+            else:
+                row[key] = item.get(key)
+        return typed(row)
+
+    def _flush(self):
+        '''Write buffered rows to every output file.'''
+        if not self.rows:
+            return
+        rows, self.rows = self.rows, []
+        for writer in self.writers:
+            writer.write(rows)
+        self.stats.inc_value('output/batches')
+        self.stats.inc_value('output/rows', len(rows))
+
+    # overriden class methods
+
+    def open_spider(self, *args, **kwargs):
+        '''Open output files and start flushing on an interval on signal.'''
+        for writer in self.writers:
+            writer.open(self.append)
+            message = 'Output pipeline - Started exporting to file: {}'
+            logger.info(message.format(writer.path))
+        if self.interval:
+            self.loop = LoopingCall(self._flush)
+            self.loop.start(self.interval, now=False)
+
+    def close_spider(self, *args, **kwargs):
+        '''Flush remaining rows and close output files on signal.'''
+        if self.loop and self.loop.running:
+            self.loop.stop()
+        self._flush()
+        for writer in self.writers:
+            writer.close()
+            message = 'Output pipeline - Finished exporting to file: {}'
+            logger.info(message.format(writer.path))
+
+    def process_item(self, item, *args, **kwargs):
+        '''Buffer item row and write a batch once full.'''
+        if not self._exported(item):
+            return item
+        self.rows.append(self._row(item))
+        if len(self.rows) >= self.batch_size:
+            self._flush()
         return item
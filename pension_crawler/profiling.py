@@ -0,0 +1,349 @@
+'''profiling.py'''
+
+import cProfile
+import functools
+import inspect
+import logging
+import os
+import pstats
+import random
+import threading
+import tracemalloc
+
+from collections import Counter
+from datetime import datetime
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.misc import load_object
+
+
+# logging
+
+logger = logging.getLogger(__name__)
+
+
+# signals
+
+profile_reported = object()
+
+
+# one sampled call at a time per process, profilers can not be nested
+
+lock = threading.Lock()
+
+
+# allocations of tracemalloc and of profiling itself are not reported
+
+FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, cProfile.__file__),
+    tracemalloc.Filter(False, pstats.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<unknown>')
+]
+
+
+class RawStats(object):
+
+    '''Profile statistics received from another process.'''
+
+    # constructor
+
+    def __init__(self, stats, *args, **kwargs):
+        '''Set statistics dictionary.'''
+        self.stats = stats
+
+    # public methods
+
+    def create_stats(self):
+        '''Keep statistics as received, called by pstats.'''
+        pass
+
+
+class Sampler(object):
+
+    '''Profile sampled calls with cProfile and tracemalloc.'''
+
+    # class variables
+
+    modes = ('cprofile', 'tracemalloc')
+
+    # constructor
+
+    def __init__(self, modes, rate=1.0, top=25, frames=1, *args, **kwargs):
+        '''Set profilers, sample rate and report options.'''
+        self.enabled = tuple(modes)
+        self.rate = rate
+        self.top = top
+        self.frames = frames
+        self.calls = 0
+        self.sampled = 0
+        self.stats = None
+        self.allocations = Counter()
+        self.blocks = Counter()
+
+    # class methods
+
+    @classmethod
+    def from_settings(cls, settings):
+        '''Return sampler or none if profiling disabled.'''
+        if not settings.getbool('PROFILING_ENABLED'):
+            return
+        modes = settings.getlist('PROFILING_MODES')
+        for mode in modes:
+            if mode not in cls.modes:
+                raise NotConfigured('Unknown profiling mode: {}'.format(mode))
+        if not modes:
+            raise NotConfigured('Profiling modes not specified.')
+        return cls(
+            modes, settings.getfloat('PROFILING_SAMPLE_RATE'),
+            settings.getint('PROFILING_TOP'),
+            settings.getint('PROFILING_FRAMES')
+        )
+
+    # properties
+
+    @property
+    def options(self):
+        '''Return constructor arguments for samplers in workers.'''
+        return self.enabled, self.rate, self.top, self.frames
+
+    # private methods
+
+    def _sample(self, function, args, kwargs):
+        '''Call function with enabled profilers.'''
+        self.sampled += 1
+        profiler = None
+        snapshot = None
+        if 'tracemalloc' in self.enabled:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+            snapshot = tracemalloc.take_snapshot().filter_traces(FILTERS)
+        if 'cprofile' in self.enabled:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            if snapshot is not None:
+                self._allocated(snapshot)
+            if profiler is not None:
+                self._profiled(profiler)
+
+    def _profiled(self, profiler):
+        '''Add profile of call to statistics.'''
+        if self.stats is None:
+            self.stats = pstats.Stats(profiler)
+        else:
+            self.stats.add(profiler)
+
+    def _allocated(self, before):
+        '''Add memory still allocated after call to allocations.'''
+        after = tracemalloc.take_snapshot().filter_traces(FILTERS)
+        diffs = [
+            i for i in after.compare_to(before, 'lineno') if i.size_diff > 0
+        ]
+        for diff in diffs[:self.top]:
+            location = str(diff.traceback)
+            self.allocations[location] += diff.size_diff
+            self.blocks[location] += diff.count_diff
+
+    def _iterate(self, generator):
+        '''Yield from generator, sampling every step.'''
+        while True:
+            try:
+                value = self.call(next, generator)
+            except StopIteration as stop:
+                return stop.value
+            yield value
+
+    # public methods
+
+    def call(self, function, *args, **kwargs):
+        '''Call function, profiling it if sampled and no call is.'''
+        self.calls += 1
+        if self.rate < 1 and random.random() >= self.rate:
+            return function(*args, **kwargs)
+        if not lock.acquire(False):
+            return function(*args, **kwargs)
+        try:
+            return self._sample(function, args, kwargs)
+        finally:
+            lock.release()
+
+    def wrap(self, function):
+        '''Return function sampling its calls and generator steps.'''
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            result = self.call(function, *args, **kwargs)
+            if inspect.isgenerator(result):
+                return self._iterate(result)
+            return result
+        return wrapper
+
+    def report(self):
+        '''Return collected data as a dictionary.'''
+        return {
+            'calls': self.calls,
+            'sampled': self.sampled,
+            'stats': self.stats.stats if self.stats else {},
+            'allocations': dict(self.allocations),
+            'blocks': dict(self.blocks)
+        }
+
+    def merge(self, report):
+        '''Add data collected by another sampler.'''
+        self.calls += report['calls']
+        self.sampled += report['sampled']
+        if report['stats']:
+            self._profiled(RawStats(report['stats']))
+        self.allocations.update(report['allocations'])
+        self.blocks.update(report['blocks'])
+
+    def dump(self, prefix):
+        '''Write profile dump and reports, return written paths.'''
+        paths = []
+        if self.stats is not None:
+            self.stats.dump_stats('{}.prof'.format(prefix))
+            with open('{}.txt'.format(prefix), 'w') as file_:
+                self.stats.stream = file_
+                self.stats.sort_stats('cumulative').print_stats(self.top)
+            paths.extend(['{}.prof'.format(prefix), '{}.txt'.format(prefix)])
+        if self.allocations:
+            path = '{}-allocations.txt'.format(prefix)
+            with open(path, 'w') as file_:
+                file_.write('Calls: {}, sampled: {}\n\n'.format(
+                    self.calls, self.sampled
+                ))
+                for location, size in self.allocations.most_common(self.top):
+                    file_.write('{:>12} B {:>8} blocks  {}\n'.format(
+                        size, self.blocks[location], location
+                    ))
+            paths.append(path)
+        return paths
+
+
+class ProfilingExtension(object):
+
+    '''Profile pipelines, spider callbacks and PDF parsing.
+
+    process_item of the enabled pipelines in pension_crawler.pipelines and
+    the parse callbacks of the spider are wrapped on their classes until
+    the spider closes. PDF parses are profiled where they run, including
+    in the process pool, and sent back with their results.
+    '''
+
+    # class variables
+
+    module = 'pension_crawler.pipelines'
+
+    # constructor
+
+    def __init__(self, crawler, sampler, directory, *args, **kwargs):
+        '''Set crawler, sampler options and output directory.'''
+        self.crawler = crawler
+        self.options = sampler.options
+        self.directory = directory
+        self.samplers = {}
+        self.patched = []
+        self.tracing = False
+
+    # class methods
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        '''Pass settings to constructor, wrap methods and connect signals.'''
+        sampler = Sampler.from_settings(crawler.settings)
+        if sampler is None:
+            raise NotConfigured('Profiling disabled.')
+        directory = crawler.settings.get('PROFILING_DIR')
+        if not directory:
+            raise NotConfigured('Profiling directory not specified.')
+        extension = cls(crawler, sampler, directory)
+        extension._patch_pipelines(crawler.settings)
+        extension._patch_spider(crawler.spidercls)
+        crawler.signals.connect(
+            extension.spider_opened, signal=signals.spider_opened
+        )
+        crawler.signals.connect(
+            extension.spider_closed, signal=signals.spider_closed
+        )
+        crawler.signals.connect(
+            extension.profile_reported, signal=profile_reported
+        )
+        return extension
+
+    # private methods
+
+    def _sampler(self, stage):
+        '''Return sampler of stage.'''
+        sampler = self.samplers.get(stage)
+        if sampler is None:
+            sampler = self.samplers[stage] = Sampler(*self.options)
+        return sampler
+
+    def _patch(self, cls, name):
+        '''Wrap method of class with sampler of its stage.'''
+        stage = '{}.{}'.format(cls.__name__, name)
+        self.patched.append((cls, name, cls.__dict__.get(name)))
+        wrapper = self._sampler(stage).wrap(getattr(cls, name))
+        setattr(cls, name, wrapper)
+
+    def _patch_pipelines(self, settings):
+        '''Wrap process_item of enabled pipelines.'''
+        for path in settings.getdict('ITEM_PIPELINES'):
+            cls = load_object(path)
+            if cls.__module__ == self.module:
+                self._patch(cls, 'process_item')
+
+    def _patch_spider(self, spidercls):
+        '''Wrap parse callbacks of spider.'''
+        for name in dir(spidercls):
+            if name == 'parse' or name.startswith('parse_'):
+                if callable(getattr(spidercls, name)):
+                    self._patch(spidercls, name)
+
+    def _restore(self):
+        '''Restore wrapped methods.'''
+        for cls, name, original in reversed(self.patched):
+            if original is None:
+                delattr(cls, name)
+            else:
+                setattr(cls, name, original)
+        self.patched = []
+
+    # public methods
+
+    def spider_opened(self, spider):
+        '''Start tracing allocations on signal.'''
+        if 'tracemalloc' in self.options[0] and not tracemalloc.is_tracing():
+            tracemalloc.start(self.options[3])
+            self.tracing = True
+
+    def spider_closed(self, spider, reason):
+        '''Restore methods and write reports of every stage on signal.'''
+        self._restore()
+        os.makedirs(self.directory, exist_ok=True)
+        prefix = os.path.join(self.directory, 'profile-{}-{}'.format(
+            spider.name, datetime.now().strftime('%Y-%m-%d-%H-%M')
+        ))
+        for stage, sampler in sorted(self.samplers.items()):
+            for key in ('calls', 'sampled'):
+                self.crawler.stats.set_value(
+                    'profiling/{}/{}'.format(stage, key),
+                    getattr(sampler, key), spider=spider
+                )
+            for path in sampler.dump('{}-{}'.format(prefix, stage)):
+                message = 'Profiling extension - Wrote report: {}'
+                logger.info(message.format(path))
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+
+    def profile_reported(self, stage, report, *args, **kwargs):
+        '''Merge data collected in PDF workers on signal.'''
+        self._sampler(stage).merge(report)
@@ -0,0 +1,34 @@
+'''settings.py'''
+
+import os
+
+from pension_crawler.bing.settings import SETTINGS as BING_SETTINGS
+from pension_crawler.google.settings import SETTINGS as GOOGLE_SETTINGS
+from pension_crawler.settings import DATA_DIR, DOWNLOAD_ENABLED
+from pension_crawler.utils import CustomSettings
+
+
+fields = [
+    'engine', 'keyword', 'url', 'title', 'state', 'system', 'report_type',
+    'year', 'page_count', 'path', 'status'
+]
+custom_settings = CustomSettings(DOWNLOAD_ENABLED, fields)
+
+
+SETTINGS = {
+
+    # Scrapy settings
+
+    'ITEM_PIPELINES': custom_settings.item_pipelines,
+    'FIELDS_TO_EXPORT': custom_settings.fields_to_export,
+
+    # Custom settings
+
+    'INPUT_FILE': 'default.csv',
+    'INPUT_DIR': os.path.join(DATA_DIR, 'input', 'search'),
+    'OUTPUT_DIR': os.path.join(DATA_DIR, 'output', 'search'),
+    'SEARCH_ENGINES': ['google', 'bing'],
+    'GOOGLE_API_KEY': GOOGLE_SETTINGS['API_KEY'],
+    'GOOGLE_ENGINE_ID': GOOGLE_SETTINGS['ENGINE_ID'],
+    'BING_API_KEY': BING_SETTINGS['API_KEY']
+}
@@ -0,0 +1,40 @@
+'''spiders.py'''
+
+from scrapy.exceptions import NotConfigured
+
+from pension_crawler.engines import ENGINES
+from pension_crawler.utils import SearchSpider
+
+from .settings import SETTINGS
+
+
+class MultiSearchSpider(SearchSpider):
+
+    '''Parse results of several search APIs in one crawl.'''
+
+    # class variables
+
+    name = 'search'
+    custom_settings = SETTINGS
+
+    # class methods
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        '''Pass settings and configured engines to constructor.'''
+        data = MultiSearchSpider._data(crawler.settings)
+        depth = crawler.settings.getint('DEPTH')
+        names = crawler.settings.getlist('SEARCH_ENGINES')
+        if not depth:
+            raise NotConfigured('Crawl depth not specified.')
+        if not names:
+            raise NotConfigured('Search engines not specified.')
+        engines = []
+        for name in names:
+            if name not in ENGINES:
+                raise NotConfigured('Unknown search engine: {}'.format(name))
+            prefix = '{}_'.format(name.upper())
+            engines.append(ENGINES[name].from_settings(
+                crawler.settings, prefix
+            ))
+        return cls(crawler, data, depth, engines, *args, **kwargs)
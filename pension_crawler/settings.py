@@ -10,10 +10,76 @@ from datetime import datetime
 DATA_DIR = os.path.join(os.getcwd(), 'data')
 LOG_NAME = 'crawl-{}.log'.format(datetime.now().strftime('%Y-%m-%d-%H-%M'))
 TEMP_DIR = os.path.join(DATA_DIR, 'temp')
+STORE_DIR = os.path.join(DATA_DIR, 'stores')
+BENCH_DIR = os.path.join(DATA_DIR, 'benchmarks')
 BLACKLIST_FILE = os.path.join(DATA_DIR, 'blacklist.csv')
 DOWNLOAD_ENABLED = True
 DEPTH = 1
 PAGE_COUNT = 1
+PARTIAL_DOWNLOAD_ENABLED = False
+PARTIAL_HEAD_SIZE = 262144
+PARTIAL_TAIL_SIZE = 65536
+PARTIAL_XREF_SIZE = 1048576
+FILES_MANIFEST_ENABLED = False
+FILES_MANIFEST_FILE = os.path.join(STORE_DIR, 'manifest.db')
+FILES_INDEX_FILE = os.path.join(STORE_DIR, 'files.db')
+FILES_STORE_LAYOUT = 'flat'
+FILES_SEEN_ENABLED = True
+FILES_SEEN_FILE = os.path.join(STORE_DIR, 'seen.db')
+FILES_SEEN_EXPIRES = 90
+QUOTA_ENABLED = True
+QUOTA_FILE = os.path.join(STORE_DIR, 'quota.json')
+QUOTA_LIMITS = {
+    'www.googleapis.com': {'rate': 1, 'burst': 1, 'daily': 10000},
+    'api.cognitive.microsoft.com': {'rate': 3, 'burst': 3, 'daily': 0}
+}
+QUOTA_RETRY_TIMES = 5
+QUOTA_BACKOFF = 2
+QUOTA_BACKOFF_MAX = 300
+INPUT_SHARD = '1/1'
+INPUT_BATCH = 10000
+CHECKPOINT_ENABLED = True
+CHECKPOINT_DIR = os.path.join(STORE_DIR, 'checkpoints')
+OUTPUT_MODE = 'full'
+HISTORY_ENABLED = True
+HISTORY_FILE = os.path.join(STORE_DIR, 'history.db')
+RESULTS_ENABLED = False
+RESULTS_FILE = os.path.join(STORE_DIR, 'results.db')
+RESULTS_BATCH_SIZE = 500
+RESULTS_FLUSH_INTERVAL = 30
+OUTPUT_FORMATS = []
+OUTPUT_BATCH_SIZE = 500
+OUTPUT_FLUSH_INTERVAL = 30
+HTTPCACHE_SIZE = 1073741824
+HTTPCACHE_COMPRESSION_LEVEL = 6
+PDF_STREAM_PAGES = False
+PDF_POOL_ENABLED = False
+PDF_POOL_WORKERS = 0
+PDF_POOL_TIMEOUT = 300
+PDF_CACHE_ENABLED = True
+PDF_CACHE_FILE = os.path.join(STORE_DIR, 'pdf_cache.db')
+PDF_CACHE_SIZE = 1000000
+OCR_STAGE_ENABLED = False
+OCR_CONCURRENCY = 1
+OCR_TIMEOUT = 600
+OCR_DEFERRED = False
+METRICS_ENABLED = True
+METRICS_FILE = os.path.join(
+    DATA_DIR, 'logs',
+    'metrics-{}.json'.format(datetime.now().strftime('%Y-%m-%d-%H-%M'))
+)
+METRICS_INTERVAL = 60
+METRICS_PORT = 0
+METRICS_HOST = '127.0.0.1'
+METRICS_BUCKETS = [
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300
+]
+PROFILING_ENABLED = False
+PROFILING_MODES = ['cprofile']
+PROFILING_SAMPLE_RATE = 1.0
+PROFILING_TOP = 25
+PROFILING_FRAMES = 1
+PROFILING_DIR = os.path.join(DATA_DIR, 'logs')
 USER_AGENTS = [
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like '
     'Gecko) Chrome/63.0.3239.132 Safari/537.36',
@@ -44,14 +110,26 @@ BOT_NAME = 'pension_crawler'
 LOG_LEVEL = 'DEBUG'
 LOG_FILE = os.path.join(DATA_DIR, 'logs', LOG_NAME)
 SPIDER_MODULES = [
-    'pension_crawler.google', 'pension_crawler.bing', 'pension_crawler.sites'
+    'pension_crawler.google', 'pension_crawler.bing',
+    'pension_crawler.search', 'pension_crawler.sites'
 ]
+COMMANDS_MODULE = 'pension_crawler.commands'
 DOWNLOADER_MIDDLEWARES = {
     'pension_crawler.middlewares.BlacklistMiddleware': 400,
     'pension_crawler.middlewares.UserAgentMiddleware': 410,
+    'pension_crawler.middlewares.QuotaMiddleware': 950,
+}
+EXTENSIONS = {
+    'pension_crawler.extensions.MetricsExtension': 500,
+    'pension_crawler.profiling.ProfilingExtension': 510,
+}
+SPIDER_MIDDLEWARES = {
+    'pension_crawler.middlewares.CheckpointMiddleware': 40,
 }
 FILES_STORE = os.path.join(DATA_DIR, 'downloads')
 COOKIES_ENABLED = False
 DOWNLOAD_DELAY = 1
 HTTPCACHE_ENABLED = True
 HTTPCACHE_EXPIRATION_SECS = 604800
+HTTPCACHE_STORAGE = 'pension_crawler.httpcache.SQLiteCacheStorage'
+HTTPCACHE_POLICY = 'pension_crawler.httpcache.NoPDFPolicy'
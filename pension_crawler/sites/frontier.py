@@ -0,0 +1,103 @@
+'''frontier.py'''
+
+import heapq
+import itertools
+import re
+
+from urllib.parse import unquote, urldefrag, urlparse
+
+import tldextract
+
+
+# link paths that are never crawled as pages
+
+IGNORED = re.compile(
+    r'\.(pdf|jpe?g|png|gif|svg|ico|zip|gz|docx?|xlsx?|pptx?|csv|txt|mp[34]|'
+    r'avi|mov|css|js|xml|rss|json)$', re.IGNORECASE
+)
+YEAR = re.compile(r'(?<!\d)(19|20)\d{2}(?!\d)')
+SEPARATORS = re.compile(r'[\W_]+')
+
+
+def domain(url):
+    '''Return registered domain of url.'''
+    extract = tldextract.extract(url)
+    return '.'.join(i for i in (extract.domain, extract.suffix) if i)
+
+
+def score(url, text, keywords):
+    '''Return how likely a link leads to reports.'''
+    url = SEPARATORS.sub(' ', unquote(urlparse(url).path).lower())
+    text = SEPARATORS.sub(' ', (text or '').lower())
+    value = 0
+    for keyword, weight in keywords.items():
+        if keyword in text:
+            value += weight * 2
+        if keyword in url:
+            value += weight
+    if YEAR.search(url):
+        value += 2
+    if YEAR.search(text):
+        value += 1
+    return value
+
+
+class Frontier(object):
+
+    '''Prioritized links to crawl within a single site.'''
+
+    # constructor
+
+    def __init__(self, url, budget, width, *args, **kwargs):
+        '''Set site domain, page budget and maximum pages in flight.'''
+        self.domain = domain(url)
+        self.budget = budget
+        self.width = width
+        self.heap = []
+        self.seen = set([urldefrag(url)[0]])
+        self.counter = itertools.count()
+        self.active = 1
+        self.crawled = 0
+
+    # properties
+
+    @property
+    def ready(self):
+        '''Return true if another page can be crawled.'''
+        return bool(self.heap) and self.active < self.width and (
+            self.crawled < self.budget
+        )
+
+    # public methods
+
+    def add(self, url):
+        '''Mark url as seen and return true if it was not seen before.'''
+        url = urldefrag(url)[0]
+        if url in self.seen:
+            return False
+        self.seen.add(url)
+        return True
+
+    def push(self, url, text, level, keywords):
+        '''Add page link with its priority if it is within the site.'''
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https'):
+            return
+        if IGNORED.search(parsed.path) or domain(url) != self.domain:
+            return
+        if not self.add(url):
+            return
+        value = score(url, text, keywords)
+        entry = (-value, next(self.counter), urldefrag(url)[0], level)
+        heapq.heappush(self.heap, entry)
+
+    def pop(self):
+        '''Return priority, url and level of best link.'''
+        value, _, url, level = heapq.heappop(self.heap)
+        self.active += 1
+        self.crawled += 1
+        return -value, url, level
+
+    def release(self):
+        '''Mark page in flight as done.'''
+        self.active = max(0, self.active - 1)
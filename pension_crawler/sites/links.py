@@ -0,0 +1,34 @@
+'''links.py'''
+
+from urllib.parse import urljoin
+
+from scrapy.utils.response import get_base_url
+
+
+def extract_links(response, pages=False):
+    '''Return unique PDF links and page links in a single pass.
+
+    Links are absolute href and text pairs. Page links are only collected
+    if pages is true.
+    '''
+    base = get_base_url(response)
+    seen = set()
+    pdfs = []
+    others = []
+    for node in response.selector.root.iter('a'):
+        href = node.get('href')
+        if not href:
+            continue
+        pdf = 'pdf' in href.lower()
+        if not (pdf or pages):
+            continue
+        href = urljoin(base, href.strip())
+        if href in seen:
+            continue
+        seen.add(href)
+        text = ' '.join(''.join(node.itertext()).split())
+        if pdf:
+            pdfs.append((href, text))
+        else:
+            others.append((href, text))
+    return pdfs, others
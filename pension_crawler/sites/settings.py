@@ -8,7 +8,7 @@ from pension_crawler.utils import CustomSettings
 
 fields = [
     'url', 'href', 'text', 'state', 'system', 'report_type', 'year',
-    'page_count', 'path', 'downloaded'
+    'page_count', 'path', 'downloaded', 'status'
 ]
 custom_settings = CustomSettings(DOWNLOAD_ENABLED, fields)
 
@@ -19,11 +19,30 @@ SETTINGS = {
 
     'ITEM_PIPELINES': custom_settings.item_pipelines,
     'FIELDS_TO_EXPORT': custom_settings.fields_to_export,
+    'CONCURRENT_REQUESTS_PER_DOMAIN': 2,
 
     # Custom settings
 
     'INPUT_FILE': 'default.csv',
     'INPUT_DIR': os.path.join(DATA_DIR, 'input', 'sites'),
     'OUTPUT_DIR': os.path.join(DATA_DIR, 'output', 'sites'),
+    'FRONTIER_DEPTH': 0,
+    'FRONTIER_PAGE_BUDGET': 1000,
+    'FRONTIER_SITE_BUDGET': 25,
+    'FRONTIER_KEYWORDS': {
+        'annual report': 3,
+        'comprehensive annual financial': 3,
+        'cafr': 3,
+        'actuarial': 3,
+        'valuation': 2,
+        'financial report': 2,
+        'financial statement': 2,
+        'investment report': 2,
+        'report': 1,
+        'publication': 1,
+        'document': 1,
+        'archive': 1,
+        'library': 1
+    },
 
 }
@@ -3,16 +3,21 @@
 import re
 
 from datetime import datetime
-from urllib.parse import urlparse, urlunparse
 
 from scrapy import Request
+from scrapy.http import HtmlResponse
 
-from pension_crawler.loaders import PDFLoader
+from pension_crawler.items import PDFItem
 from pension_crawler.utils import BaseSpider
 
+from .frontier import Frontier
+from .links import extract_links
 from .settings import SETTINGS
 
 
+YEAR = re.compile(r'(19|20)\d{2}')
+
+
 class SitesSpider(BaseSpider):
 
     '''Extract pdf files from a list of sites.'''
@@ -21,14 +26,23 @@ class SitesSpider(BaseSpider):
 
     name = 'sites'
     custom_settings = SETTINGS
+    job_attributes = ('depth', 'page_budget', 'site_budget', 'width')
 
     # constructor
 
-    def __init__(self, crawler, data, *args, **kwargs):
-        '''Set crawler and input list.'''
+    def __init__(self, crawler, data, depth=0, page_budget=0, site_budget=0,
+                 width=1, keywords=None, *args, **kwargs):
+        '''Set crawler, input list and frontier limits.'''
         super(SitesSpider, self).__init__(*args, **kwargs)
         self.crawler = crawler
         self.data = data
+        self.depth = depth
+        self.page_budget = page_budget
+        self.site_budget = site_budget
+        self.width = width
+        self.keywords = keywords or {}
+        self.frontiers = {}
+        self.pages = 0
 
     # class methods
 
@@ -36,68 +50,115 @@ class SitesSpider(BaseSpider):
     def from_crawler(cls, crawler, *args, **kwargs):
         '''Pass crawler and start urls to constructor.'''
         data = SitesSpider._data(crawler.settings)
-        return cls(crawler, data, *args, **kwargs)
+        settings = crawler.settings
+        return cls(
+            crawler, data, settings.getint('FRONTIER_DEPTH'),
+            settings.getint('FRONTIER_PAGE_BUDGET'),
+            settings.getint('FRONTIER_SITE_BUDGET'),
+            settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN'),
+            settings.getdict('FRONTIER_KEYWORDS'), *args, **kwargs
+        )
 
     # private methods
 
-    def _href(self, url, node):
-        '''Get href full location.'''
-        parsed_url = urlparse(url)
-        href = node.xpath('@href').extract_first().replace('../', '')
-        parsed_href = urlparse(href)
-        if not (parsed_href.scheme or parsed_href.netloc):
-            parsed_href = parsed_href._replace(scheme=parsed_url.scheme)
-            parsed_href = parsed_href._replace(netloc=parsed_url.netloc)
-        return urlunparse(parsed_href)
-
-    def _process_item(self, url, node):
-        '''Load PDF item.'''
-        href = self._href(url, node)
-        loader = PDFLoader(selector=node)
-        loader.add_value('url', url)
-        loader.add_value('href', href)
-        loader.add_xpath('text', 'text()')
-        loader.add_value('file_urls', [href])
-        loader.add_value('timestamp', datetime.now().isoformat())
-        return loader.load_item()
-
-    def _process_year(self, node):
+    def _process_item(self, url, href, text):
+        '''Return PDF item.'''
+        item = PDFItem(
+            url=url, href=href, file_urls=[href],
+            timestamp=datetime.now().isoformat()
+        )
+        if text:
+            item['text'] = text
+        return item
+
+    def _process_year(self, href, text):
         '''Try to extract year from PDF link.'''
-        text_list = [
-            node.xpath('text()').extract_first(),
-            node.xpath('@href').extract_first()
-        ]
-        for text in text_list:
-            try:
-                value = re.search(r'(19|20)\d{2}', text).group()
+        for value in (text, href):
+            match = YEAR.search(value)
+            if match:
                 message = 'Sites spider - Year {} found in link text {}.'
-                self.logger.info(message.format(value, text))
-                return value
-            except (TypeError, AttributeError):
-                message = 'Sites spider - Year not found in link text {}.'
-                self.logger.info(message.format(text))
+                self.logger.info(message.format(match.group(), value))
+                return match.group()
+        message = 'Sites spider - Year not found in link {}.'
+        self.logger.debug(message.format(href))
+
+    def _schedule(self, meta):
+        '''Return requests for best links within site and page budgets.'''
+        key = meta['frontier']
+        frontier = self.frontiers[key]
+        requests = []
+        while frontier.ready and self.pages < self.page_budget:
+            priority, url, level = frontier.pop()
+            self.pages += 1
+            self.crawler.stats.inc_value('frontier/pages')
+            message = 'Sites spider - Frontier page {} (priority {}): {}'
+            self.logger.info(message.format(self.pages, priority, url))
+            request_meta = self._meta(meta)
+            request_meta.update(
+                frontier=key, level=level, input_rows=meta['input_rows']
+            )
+            requests.append(Request(
+                url, callback=self.parse, errback=self._failed,
+                priority=priority, meta=request_meta, dont_filter=True
+            ))
+        return requests
+
+    def _shard_key(self, row):
+        '''Return site url so each site is crawled by one shard.'''
+        return row.get('url') or ''
+
+    def _failed(self, failure):
+        '''Release failed frontier page and schedule next links.'''
+        meta = failure.request.meta
+        frontier = self.frontiers.get(meta.get('frontier'))
+        if not frontier:
+            return []
+        frontier.release()
+        return self._schedule(meta)
 
     # class method overrides
 
     def start_requests(self):
         '''Dispatch requests per site url.'''
-        for row in self.data:
+        for request in self._start():
+            yield request
+        for key, row in self._rows():
             url = row.get('url')
             message = 'Sites spider - Parsing PDFs for url: {}'
             self.logger.info(message.format(url))
-            yield Request(url, meta=self._meta(row))
+            meta = self._meta(row)
+            meta['input_rows'] = [key]
+            if not self.depth:
+                yield Request(url, meta=meta)
+                continue
+            self.frontiers[key] = Frontier(url, self.site_budget, self.width)
+            meta.update(frontier=key, level=0)
+            yield Request(url, meta=meta, errback=self._failed)
 
     def parse(self, response):
         '''Parse search results.'''
-        results = []
-        for node in response.xpath('//a[contains(@href,"pdf")]'):
-            results.append(node)
-        for node in response.xpath('//a[contains(@href,"PDF")]'):
-            results.append(node)
+        frontier = self.frontiers.get(response.meta.get('frontier'))
+        if frontier:
+            frontier.release()
+            if not isinstance(response, HtmlResponse):
+                for request in self._schedule(response.meta):
+                    yield request
+                return
+        level = response.meta.get('level', 0)
+        pages = bool(frontier) and level < self.depth
+        results, links = extract_links(response, pages)
         message = 'Sites spider - Found {} PDF links for url: {}'
         self.logger.info(message.format(len(results), response.url))
-        for node in results:
-            item = self._process_item(response.url, node)
+        for href, text in results:
+            if frontier and not frontier.add(href):
+                continue
+            item = self._process_item(response.url, href, text)
             item = self._process_meta(item, response.meta)
-            item['year'] = self._process_year(node)
+            item['year'] = self._process_year(href, text)
             yield item
+        if not frontier:
+            return
+        for href, text in links:
+            frontier.push(href, text, level + 1, self.keywords)
+        for request in self._schedule(response.meta):
+            yield request
@@ -0,0 +1,667 @@
+'''stores.py'''
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from w3lib.url import canonicalize_url
+
+
+# logging
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStore(object):
+
+    '''Common functionality for SQLite backed stores.'''
+
+    # class variables
+
+    schema = ''
+
+    # constructor
+
+    def __init__(self, path, *args, **kwargs):
+        '''Set database path.'''
+        self.path = path
+        self.connection = None
+
+    # public methods
+
+    def open(self):
+        '''Open database and create schema.'''
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(
+            self.path, timeout=30, check_same_thread=False
+        )
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(self.schema)
+        self.connection.commit()
+
+    def close(self):
+        '''Commit pending changes and close database.'''
+        if self.connection is None:
+            return
+        self.connection.commit()
+        self.connection.close()
+        self.connection = None
+
+
+class ExtractionCache(SQLiteStore):
+
+    '''PDF parser results keyed by file content hash.'''
+
+    # class variables
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS results (
+            checksum TEXT PRIMARY KEY,
+            version TEXT NOT NULL,
+            year TEXT,
+            page_count INTEGER,
+            length INTEGER,
+            extractor TEXT,
+            accessed REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+    '''
+
+    # constructor
+
+    def __init__(self, path, version, size, *args, **kwargs):
+        '''Set database path, extraction version and maximum size.'''
+        super(ExtractionCache, self).__init__(path, *args, **kwargs)
+        self.version = version
+        self.size = size
+        self.count = 0
+
+    # private methods
+
+    def _evict(self):
+        '''Delete least recently used results above maximum size.'''
+        excess = self.count - self.size
+        self.connection.execute(
+            'DELETE FROM results WHERE checksum IN (SELECT checksum FROM '
+            'results ORDER BY accessed LIMIT ?)', (excess,)
+        )
+        self.count -= excess
+        message = 'Extraction cache - Evicted {} results.'
+        logger.info(message.format(excess))
+
+    # public methods
+
+    def open(self):
+        '''Open database and count stored results.'''
+        super(ExtractionCache, self).open()
+        cursor = self.connection.execute('SELECT COUNT(*) FROM results')
+        self.count = cursor.fetchone()[0]
+
+    def get(self, checksum):
+        '''Return results for checksum or none.'''
+        cursor = self.connection.execute(
+            'SELECT version, year, page_count, length, extractor FROM results '
+            'WHERE checksum = ?', (checksum,)
+        )
+        row = cursor.fetchone()
+        if not row:
+            return
+        if row[0] != self.version:
+            self.connection.execute(
+                'DELETE FROM results WHERE checksum = ?', (checksum,)
+            )
+            self.connection.commit()
+            self.count -= 1
+            return
+        self.connection.execute(
+            'UPDATE results SET accessed = ? WHERE checksum = ?',
+            (time.time(), checksum)
+        )
+        self.connection.commit()
+        return {
+            'year': row[1],
+            'page_count': row[2],
+            'length': row[3],
+            'extractor': row[4]
+        }
+
+    def put(self, checksum, result):
+        '''Store results for checksum.'''
+        values = (
+            self.version, result['year'], result['page_count'],
+            result['length'], result['extractor'], time.time(), checksum
+        )
+        cursor = self.connection.execute(
+            'UPDATE results SET version = ?, year = ?, page_count = ?, '
+            'length = ?, extractor = ?, accessed = ? WHERE checksum = ?',
+            values
+        )
+        if not cursor.rowcount:
+            self.connection.execute(
+                'INSERT INTO results (version, year, page_count, length, '
+                'extractor, accessed, checksum) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                values
+            )
+            self.count += 1
+        if self.size and self.count > self.size:
+            self._evict()
+        self.connection.commit()
+
+
+class URLManifest(SQLiteStore):
+
+    '''HTTP validators and content checksum of downloaded files by url.'''
+
+    # class variables
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS manifest (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            length INTEGER,
+            checksum TEXT,
+            updated REAL NOT NULL
+        );
+    '''
+
+    # public methods
+
+    def get(self, url):
+        '''Return manifest entry for url or none.'''
+        cursor = self.connection.execute(
+            'SELECT etag, last_modified, length, checksum FROM manifest '
+            'WHERE url = ?', (url,)
+        )
+        row = cursor.fetchone()
+        if not row:
+            return
+        return {
+            'etag': row[0],
+            'last_modified': row[1],
+            'length': row[2],
+            'checksum': row[3]
+        }
+
+    def put(self, url, etag, last_modified, length, checksum):
+        '''Store manifest entry for url.'''
+        self.connection.execute(
+            'INSERT OR REPLACE INTO manifest (url, etag, last_modified, '
+            'length, checksum, updated) VALUES (?, ?, ?, ?, ?, ?)',
+            (url, etag, last_modified, length, checksum, time.time())
+        )
+        self.connection.commit()
+
+
+class FileIndex(SQLiteStore):
+
+    '''Names of downloaded files with the time they were added.'''
+
+    # class variables
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS files (
+            name TEXT PRIMARY KEY,
+            added REAL NOT NULL
+        );
+    '''
+
+    # static methods
+
+    @staticmethod
+    def _scan(directory):
+        '''Yield name and modification time of files in directory tree.'''
+        for root, _, fnames in os.walk(directory):
+            for fname in fnames:
+                path = os.path.join(root, fname)
+                try:
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    continue
+                yield fname.split('.')[0], mtime
+
+    # public methods
+
+    def get(self, name):
+        '''Return time file was added or none.'''
+        cursor = self.connection.execute(
+            'SELECT added FROM files WHERE name = ?', (name,)
+        )
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+
+    def add(self, name, added=None):
+        '''Add file name if it is not indexed.'''
+        self.connection.execute(
+            'INSERT OR IGNORE INTO files (name, added) VALUES (?, ?)',
+            (name, added or time.time())
+        )
+        self.connection.commit()
+
+    def rebuild(self, directory):
+        '''Replace index with files found in directory and return count.'''
+        self.connection.execute('DELETE FROM files')
+        self.connection.executemany(
+            'INSERT OR IGNORE INTO files (name, added) VALUES (?, ?)',
+            self._scan(directory)
+        )
+        self.connection.commit()
+        cursor = self.connection.execute('SELECT COUNT(*) FROM files')
+        count = cursor.fetchone()[0]
+        message = 'File index - Indexed {} files from {}.'
+        logger.info(message.format(count, directory))
+        return count
+
+
+class SeenURLs(SQLiteStore):
+
+    '''Downloaded file path and checksum by canonical url hash.'''
+
+    # class variables
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS seen (
+            key INTEGER PRIMARY KEY,
+            path TEXT NOT NULL,
+            checksum TEXT,
+            seen REAL NOT NULL
+        );
+    '''
+
+    # static methods
+
+    @staticmethod
+    def _key(url):
+        '''Return signed 64 bit hash of canonical url.'''
+        digest = hashlib.sha1(canonicalize_url(url).encode('utf-8')).digest()
+        return int.from_bytes(digest[:8], 'big', signed=True)
+
+    # public methods
+
+    def get(self, url, expires=0):
+        '''Return file path and checksum for url seen within expiry.'''
+        cursor = self.connection.execute(
+            'SELECT path, checksum, seen FROM seen WHERE key = ?',
+            (self._key(url),)
+        )
+        row = cursor.fetchone()
+        if not row:
+            return
+        if expires and row[2] < time.time() - expires:
+            return
+        return {'path': row[0], 'checksum': row[1]}
+
+    def put(self, url, path, checksum):
+        '''Store file path and checksum for url.'''
+        self.connection.execute(
+            'INSERT OR REPLACE INTO seen (key, path, checksum, seen) '
+            'VALUES (?, ?, ?, ?)',
+            (self._key(url), path, checksum, time.time())
+        )
+        self.connection.commit()
+
+
+class History(SQLiteStore):
+
+    '''Content hash and status of results emitted by earlier runs.'''
+
+    # class variables
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS history (
+            key INTEGER PRIMARY KEY,
+            checksum TEXT,
+            status TEXT NOT NULL,
+            updated REAL NOT NULL,
+            seen REAL NOT NULL
+        );
+    '''
+
+    # static methods
+
+    @staticmethod
+    def _key(spider, url):
+        '''Return signed 64 bit hash of spider and canonical url.'''
+        text = '{} {}'.format(spider, canonicalize_url(url))
+        digest = hashlib.sha1(text.encode('utf-8')).digest()
+        return int.from_bytes(digest[:8], 'big', signed=True)
+
+    # public methods
+
+    def get(self, spider, url):
+        '''Return checksum, status and update time of url or none.'''
+        cursor = self.connection.execute(
+            'SELECT checksum, status, updated FROM history WHERE key = ?',
+            (self._key(spider, url),)
+        )
+        return cursor.fetchone()
+
+    def put(self, spider, url, checksum, status):
+        '''Store checksum of url, keeping update time if unchanged.'''
+        now = time.time()
+        key = self._key(spider, url)
+        if status == 'unchanged':
+            self.connection.execute(
+                'UPDATE history SET seen = ? WHERE key = ?', (now, key)
+            )
+        else:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO history (key, checksum, status, '
+                'updated, seen) VALUES (?, ?, ?, ?, ?)',
+                (key, checksum, status, now, now)
+            )
+        self.connection.commit()
+
+
+class ResponseCache(SQLiteStore):
+
+    '''Compressed HTTP responses by spider and request fingerprint.'''
+
+    # class variables
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS responses (
+            spider TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            url TEXT NOT NULL,
+            status INTEGER NOT NULL,
+            headers BLOB,
+            body BLOB,
+            size INTEGER NOT NULL,
+            stored REAL NOT NULL,
+            accessed REAL NOT NULL,
+            PRIMARY KEY (spider, fingerprint)
+        );
+        CREATE INDEX IF NOT EXISTS responses_stored ON responses (stored);
+        CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+    '''
+
+    # constructor
+
+    def __init__(self, path, size, *args, **kwargs):
+        '''Set database path and maximum size of stored data in bytes.'''
+        super(ResponseCache, self).__init__(path, *args, **kwargs)
+        self.size = size
+        self.total = 0
+
+    # private methods
+
+    def _evict(self):
+        '''Delete least recently used responses above maximum size.'''
+        cursor = self.connection.execute(
+            'SELECT spider, fingerprint, size FROM responses '
+            'ORDER BY accessed'
+        )
+        keys = []
+        for spider, fingerprint, size in cursor:
+            if self.total <= self.size * 0.9:
+                break
+            keys.append((spider, fingerprint))
+            self.total -= size
+        cursor.close()
+        self.connection.executemany(
+            'DELETE FROM responses WHERE spider = ? AND fingerprint = ?', keys
+        )
+        message = 'Response cache - Evicted {} responses.'
+        logger.info(message.format(len(keys)))
+
+    # public methods
+
+    def open(self):
+        '''Open database and sum size of stored data.'''
+        super(ResponseCache, self).open()
+        cursor = self.connection.execute('SELECT SUM(size) FROM responses')
+        self.total = cursor.fetchone()[0] or 0
+
+    def purge(self, expires):
+        '''Delete responses stored before expiry and return count.'''
+        before = time.time() - expires
+        cursor = self.connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses WHERE stored < ?',
+            (before,)
+        )
+        self.total -= cursor.fetchone()[0]
+        cursor = self.connection.execute(
+            'DELETE FROM responses WHERE stored < ?', (before,)
+        )
+        self.connection.commit()
+        return cursor.rowcount
+
+    def get(self, spider, fingerprint, expires=0):
+        '''Return url, status, headers and body of response or none.'''
+        cursor = self.connection.execute(
+            'SELECT url, status, headers, body, stored FROM responses '
+            'WHERE spider = ? AND fingerprint = ?', (spider, fingerprint)
+        )
+        row = cursor.fetchone()
+        if not row or (expires and row[4] < time.time() - expires):
+            return
+        self.connection.execute(
+            'UPDATE responses SET accessed = ? WHERE spider = ? AND '
+            'fingerprint = ?', (time.time(), spider, fingerprint)
+        )
+        self.connection.commit()
+        return row[:4]
+
+    def put(self, spider, fingerprint, url, status, headers, body):
+        '''Store response.'''
+        size = len(headers) + len(body)
+        cursor = self.connection.execute(
+            'SELECT size FROM responses WHERE spider = ? AND fingerprint = ?',
+            (spider, fingerprint)
+        )
+        row = cursor.fetchone()
+        if row:
+            self.total -= row[0]
+        now = time.time()
+        self.connection.execute(
+            'INSERT OR REPLACE INTO responses (spider, fingerprint, url, '
+            'status, headers, body, size, stored, accessed) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (spider, fingerprint, url, status, headers, body, size, now, now)
+        )
+        self.total += size
+        if self.size and self.total > self.size:
+            self._evict()
+        self.connection.commit()
+
+
+class JobState(SQLiteStore):
+
+    '''Spider and pipeline state and unfinished items of a crawl job.'''
+
+    # class variables
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS state (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS journal (
+            key TEXT PRIMARY KEY,
+            class TEXT NOT NULL,
+            item TEXT NOT NULL,
+            added REAL NOT NULL
+        );
+    '''
+    fname = 'pension_crawler.db'
+
+    # class methods
+
+    @classmethod
+    def from_settings(cls, settings):
+        '''Return job state of job directory or none without one.'''
+        jobdir = settings.get('JOBDIR')
+        if not jobdir:
+            return
+        return cls(os.path.join(jobdir, cls.fname))
+
+    # public methods
+
+    def get(self, key, default=None):
+        '''Return value of key or default.'''
+        cursor = self.connection.execute(
+            'SELECT value FROM state WHERE key = ?', (key,)
+        )
+        row = cursor.fetchone()
+        if not row:
+            return default
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        '''Store value of key.'''
+        self.connection.execute(
+            'INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)',
+            (key, json.dumps(value))
+        )
+        self.connection.commit()
+
+    def setdefault(self, key, value):
+        '''Return value of key, storing value if key is not set.'''
+        stored = self.get(key)
+        if stored is not None:
+            return stored
+        self.set(key, value)
+        return value
+
+    def journal(self):
+        '''Return class and data of unfinished items, oldest first.'''
+        cursor = self.connection.execute(
+            'SELECT class, item FROM journal ORDER BY added'
+        )
+        return [(row[0], json.loads(row[1])) for row in cursor]
+
+    def add(self, key, cls, item):
+        '''Record unfinished item data.'''
+        self.connection.execute(
+            'INSERT OR REPLACE INTO journal (key, class, item, added) '
+            'VALUES (?, ?, ?, ?)',
+            (key, cls, json.dumps(item, default=str), time.time())
+        )
+        self.connection.commit()
+
+    def remove(self, key):
+        '''Forget finished item.'''
+        self.connection.execute('DELETE FROM journal WHERE key = ?', (key,))
+        self.connection.commit()
+
+
+class ResultsStore(SQLiteStore):
+
+    '''Latest state of every result of all spiders and runs.'''
+
+    # class variables
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS results (
+            id INTEGER PRIMARY KEY,
+            spider TEXT NOT NULL,
+            file_url TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT '',
+            system TEXT NOT NULL DEFAULT '',
+            report_type TEXT NOT NULL DEFAULT '',
+            url TEXT,
+            title TEXT,
+            keyword TEXT,
+            engine TEXT,
+            year INTEGER,
+            page_count INTEGER,
+            path TEXT,
+            checksum TEXT,
+            status TEXT,
+            first_seen TEXT NOT NULL,
+            last_seen TEXT NOT NULL,
+            UNIQUE (spider, file_url, state, system, report_type)
+        );
+        CREATE INDEX IF NOT EXISTS results_state ON results (state);
+        CREATE INDEX IF NOT EXISTS results_system ON results (system);
+        CREATE INDEX IF NOT EXISTS results_report_type
+            ON results (report_type);
+        CREATE INDEX IF NOT EXISTS results_year ON results (year);
+        CREATE INDEX IF NOT EXISTS results_checksum ON results (checksum);
+    '''
+    keys = ['spider', 'file_url', 'state', 'system', 'report_type']
+    columns = [
+        'url', 'title', 'keyword', 'engine', 'year', 'page_count', 'path',
+        'checksum', 'status', 'last_seen'
+    ]
+    filters = ['spider', 'state', 'system', 'report_type', 'year', 'checksum']
+
+    # private methods
+
+    def _where(self, filters):
+        '''Return where clause and parameters of column filters.'''
+        clauses = []
+        params = []
+        for key in self.filters:
+            value = filters.get(key)
+            if value is None or value == '':
+                continue
+            clauses.append('{} = ?'.format(key))
+            params.append(value)
+        if not clauses:
+            return '', params
+        return 'WHERE {}'.format(' AND '.join(clauses)), params
+
+    def _rows(self, cursor):
+        '''Return rows of cursor as dictionaries.'''
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+    # public methods
+
+    def upsert(self, rows):
+        '''Insert or update rows in a single transaction.'''
+        update = 'UPDATE results SET {} WHERE {}'.format(
+            ', '.join('{} = ?'.format(i) for i in self.columns),
+            ' AND '.join('{} = ?'.format(i) for i in self.keys)
+        )
+        names = self.keys + self.columns + ['first_seen']
+        insert = 'INSERT INTO results ({}) VALUES ({})'.format(
+            ', '.join(names), ', '.join('?' for _ in names)
+        )
+        with self.connection:
+            for row in rows:
+                keys = [row.get(i) or '' for i in self.keys]
+                values = [row.get(i) for i in self.columns]
+                cursor = self.connection.execute(update, values + keys)
+                if not cursor.rowcount:
+                    self.connection.execute(
+                        insert, keys + values + [row['last_seen']]
+                    )
+        return len(rows)
+
+    def search(self, limit=None, **filters):
+        '''Return results matching column filters, newest first.'''
+        where, params = self._where(filters)
+        query = 'SELECT * FROM results {} ORDER BY last_seen DESC'.format(
+            where
+        )
+        if limit:
+            query = '{} LIMIT {:d}'.format(query, limit)
+        return self._rows(self.connection.execute(query, params))
+
+    def latest(self, **filters):
+        '''Return result with latest year per system and report type.'''
+        where, params = self._where(filters)
+        if where:
+            where = '{} AND year IS NOT NULL'.format(where)
+        else:
+            where = 'WHERE year IS NOT NULL'
+        query = (
+            'SELECT *, MAX(year) AS year FROM results {} GROUP BY state, '
+            'system, report_type ORDER BY state, system, report_type'
+        ).format(where)
+        return self._rows(self.connection.execute(query, params))
+
+    def count(self):
+        '''Return number of results.'''
+        cursor = self.connection.execute('SELECT COUNT(*) FROM results')
+        return cursor.fetchone()[0]
@@ -2,18 +2,35 @@
 
 import csv
 import errno
+import io
+import itertools
+import json
 import logging
+import multiprocessing
 import os
+import queue
 import re
-import uuid
+import tempfile
+import time
+import zlib
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
 
 import textract
 import tldextract
 
 from PyPDF2 import PdfFileReader, PdfFileWriter
+from PyPDF2.generic import IndirectObject, NameObject
+from PyPDF2.pdf import PageObject
 from PyPDF2.utils import PdfReadError
-from scrapy import Spider
+from scrapy import Request, Spider, signals
 from scrapy.exceptions import NotConfigured
+from scrapy.utils.misc import load_object
+
+from pension_crawler.profiling import Sampler
+from pension_crawler.stores import JobState
 
 
 # logging
@@ -21,6 +38,30 @@ from scrapy.exceptions import NotConfigured
 logger = logging.getLogger(__name__)
 
 
+# page attributes inherited from page tree nodes
+
+INHERITABLE = [
+    NameObject('/Resources'), NameObject('/MediaBox'), NameObject('/CropBox'),
+    NameObject('/Rotate')
+]
+
+
+# header of an indirect object at its xref offset
+
+OBJECT = re.compile(rb'\s*(\d+)\s+(\d+)\s+obj')
+
+
+@contextmanager
+def timed(timings, stage):
+    '''Add seconds spent in block to stage in timings.'''
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
 class PDFCutter(object):
 
     '''Cut PDF to target page count.'''
@@ -33,44 +74,147 @@ class PDFCutter(object):
         self.count = count
         self.temp_dir = temp_dir
         self.original = None
+        self.reader = None
+        self.file_ = None
 
-    # properties
+    # context manager
 
-    @property
-    def temp_file(self):
-        '''Return full path to temporary file.'''
-        fname = '{}.pdf'.format(uuid.uuid4().hex)
-        return os.path.join(self.temp_dir, fname)
+    def __enter__(self):
+        '''Return cutter.'''
+        return self
+
+    def __exit__(self, *args):
+        '''Close PDF file.'''
+        self.close()
 
     # private methods
 
-    def _write(self, reader, path, count):
-        '''Write PDF to temporary directory.'''
+    def _root(self):
+        '''Return root node of page tree.'''
+        return self.reader.trailer['/Root'].getObject()['/Pages'].getObject()
+
+    def _header(self, reference):
+        '''Raise PdfReadError if object is not at its xref offset.'''
+        idnum, generation = reference.idnum, reference.generation
+        if idnum in self.reader.xref_objStm:
+            idnum, generation = self.reader.xref_objStm[idnum][0], 0
+        offset = self.reader.xref.get(generation, {}).get(idnum)
+        if offset is None:
+            return
+        self.file_.seek(offset)
+        match = OBJECT.match(self.file_.read(32))
+        if not match or (
+            int(match.group(1)), int(match.group(2))
+        ) != (idnum, generation):
+            raise PdfReadError('Object {} {} not found at offset {}.'.format(
+                idnum, generation, offset
+            ))
+
+    def _write(self, pages, file_):
+        '''Write PDF pages to file object.'''
         writer = PdfFileWriter()
-        for i in range(count):
-            writer.addPage(reader.getPage(i))
-        with open(path, 'wb') as file_:
-            writer.write(file_)
+        for i in pages:
+            writer.addPage(self.page(i))
+        writer.write(file_)
 
     # public methods
 
     def cut(self):
-        '''Cut and write if PDF has more pages than target.'''
-        with open(self.path, 'rb') as file_:
-            reader = PdfFileReader(file_)
-            self.original = reader.getNumPages()
-            if self.count < self.original:
-                message = 'PDF cutter - Resizing PDF {} to {} pages.'
-                logger.info(message.format(self.path, self.count))
-                path = self.temp_file
-                self._write(reader, path, self.count)
-                self.path = path
-                message = 'PDF cutter - Created temporary PDF: {}.'
-                logger.info(message.format(self.path))
+        '''Parse PDF once and limit page count to target.'''
+        self.file_ = open(self.path, 'rb')
+        self.reader = PdfFileReader(self.file_)
+        self.original = int(self._root()['/Count'])
+        if self.count < self.original:
+            message = 'PDF cutter - Reading first {} pages of PDF {}.'
+            logger.info(message.format(self.count, self.path))
+        else:
+            self.count = self.original
+            message = 'PDF cutter - PDF {} not modified.'
+            logger.info(message.format(self.path))
+
+    def page(self, number):
+        '''Return page by walking the page tree down to it.
+
+        Unlike PdfFileReader.getPage this does not load every page object,
+        so only the objects of the requested page need to be readable.
+        '''
+        node, reference, inherit = self._root(), None, {}
+        while '/Kids' in node:
+            for name in INHERITABLE:
+                if name in node:
+                    inherit[name] = node[name]
+            for kid in node['/Kids']:
+                child = kid.getObject()
+                count = int(child.get('/Count', 1)) if '/Kids' in child else 1
+                if number < count:
+                    node, reference = child, kid
+                    break
+                number -= count
             else:
-                self.count = self.original
-                message = 'PDF cutter - PDF {} not modified.'
-                logger.info(message.format(self.path))
+                raise PdfReadError('Page not found in page tree.')
+        page = PageObject(self.reader, reference)
+        page.update(inherit)
+        page.update(node)
+        return page
+
+    def buffer(self, pages=None):
+        '''Return PDF pages, first pages by default, as in-memory file.'''
+        if pages is None:
+            pages = range(self.count)
+        buffer_ = io.BytesIO()
+        self._write(pages, buffer_)
+        buffer_.seek(0)
+        return buffer_
+
+    def verify(self):
+        '''Raise PdfReadError if an object of the first pages is missing.
+
+        PyPDF2 skips null bytes as whitespace, so an object in a zeroed
+        range of a partial file would be read from the next object.
+        '''
+        pending = [self.page(i) for i in range(self.count)]
+        seen = set()
+        while pending:
+            node = pending.pop()
+            if isinstance(node, IndirectObject):
+                if (node.idnum, node.generation) in seen:
+                    continue
+                seen.add((node.idnum, node.generation))
+                self._header(node)
+                node = node.getObject()
+            if isinstance(node, dict):
+                pending.extend(
+                    value for key, value in node.items() if key != '/Parent'
+                )
+            elif isinstance(node, list):
+                pending.extend(node)
+
+    @contextmanager
+    def temp_file(self, pages=None):
+        '''Yield path to PDF pages for tools which only read files.
+
+        The original file is used when it has no extra pages, otherwise
+        the in-memory PDF is written to a temporary file which is removed
+        on exit.
+        '''
+        if pages is None and self.count == self.original:
+            yield self.path
+            return
+        buffer_ = self.buffer(pages)
+        with tempfile.NamedTemporaryFile(
+            dir=self.temp_dir, suffix='.pdf'
+        ) as file_:
+            file_.write(buffer_.getvalue())
+            file_.flush()
+            message = 'PDF cutter - Created temporary PDF: {}.'
+            logger.info(message.format(file_.name))
+            yield file_.name
+
+    def close(self):
+        '''Close PDF file.'''
+        if self.file_:
+            self.file_.close()
+            self.file_ = None
 
 
 class PDFReader(object):
@@ -79,47 +223,72 @@ class PDFReader(object):
 
     # constructor
 
-    def __init__(self, path, count):
-        '''Set path and page count.'''
-        self.path = path
-        self.count = count
+    def __init__(self, cutter, ocr=True, timings=None):
+        '''Set cutter holding parsed PDF, OCR fallback and timings.'''
+        self.cutter = cutter
+        self.ocr = ocr
+        self.timings = {} if timings is None else timings
+        self.path = cutter.path
+        self.count = cutter.count
         self.text = ''
+        self.extractor = None
+        self.pages_read = 0
 
     # private methods
 
-    def _pypdf2(self):
+    def _pypdf2(self, pages=None):
         '''Read text from PDF using pypdf2.'''
         message = 'PDF reader - Trying to parse PDF {} text using PyPDF2.'
         logger.info(message.format(self.path))
+        if pages is None:
+            pages = range(self.count)
         text = []
-        with open(self.path, 'rb') as file_:
-            reader = PdfFileReader(file_)
-            for i in range(self.count):
-                text.append(reader.getPage(i).extractText())
+        with timed(self.timings, 'pypdf2'):
+            for i in pages:
+                text.append(self.cutter.page(i).extractText())
         return '\n'.join(text).strip()
 
-    def _textract(self):
+    def _textract(self, pages=None):
         '''Read text from PDF using textract.'''
         message = 'PDF reader - Trying to parse PDF {} text using Textract.'
         logger.info(message.format(self.path))
         try:
-            text = textract.process(
-                self.path, method='tesseract', language='eng'
-            )
+            with timed(self.timings, 'textract'):
+                with self.cutter.temp_file(pages) as path:
+                    text = textract.process(
+                        path, method='tesseract', language='eng'
+                    )
             return text.decode('utf-8').strip()
         except UnicodeDecodeError:
             pass
 
     # public methods
 
+    def pages(self):
+        '''Yield text page by page, using Textract for pages without text.'''
+        for i in range(self.count):
+            text = self._pypdf2([i])
+            extractor = 'pypdf2'
+            if not text and self.ocr:
+                text = self._textract([i])
+                extractor = 'textract'
+            self.pages_read = i + 1
+            if text:
+                self.extractor = extractor
+            yield text or ''
+
     def read(self):
         '''Read text from PDF.'''
+        self.pages_read = self.count
         self.text = self._pypdf2()
-        if not self.text:
+        self.extractor = 'pypdf2'
+        if not self.text and self.ocr:
             message = 'PDF reader - Failed to parse PDF {} text using PyPDF2.'
             logger.info(message.format(self.path))
             self.text = self._textract()
+            self.extractor = 'textract'
         if not self.text:
+            self.extractor = None
             message = 'PDF reader - Failed to parse PDF {} text using Textract.'
             logger.info(message.format(self.path))
             message = 'PDF reader - Text not found in PDF: {}.'
@@ -131,14 +300,40 @@ class PDFParser(object):
 
     '''Extract page count and year from PDF.'''
 
+    # class variables
+
+    version = 2
+    pattern = re.compile(r'\b(19|20)\d{2}\b')
+    latest = datetime.now().year + 1
+
     # constructor
 
-    def __init__(self, path, count, temp_dir):
-        '''Set path, page count and temporary directory..'''
+    def __init__(self, path, count, temp_dir, stream=False, ocr=True):
+        '''Set path, page count, temporary directory and read mode.'''
         self.path = path
         self.count = count
         self.temp_dir = temp_dir
+        self.stream = stream
+        self.ocr = ocr
         self.year = None
+        self.length = 0
+        self.extractor = None
+        self.pages = 0
+        self.timings = {}
+
+    # properties
+
+    @property
+    def result(self):
+        '''Return parse results as a dictionary.'''
+        return {
+            'year': self.year,
+            'page_count': self.count,
+            'length': self.length,
+            'extractor': self.extractor,
+            'pages': self.pages,
+            'timings': self.timings
+        }
 
     # private methods
 
@@ -154,46 +349,379 @@ class PDFParser(object):
             logger.info(message.format(self.path))
             pass
 
-    def _remove(self, path):
-        '''Remove file if it exists.'''
-        try:
-            os.remove(path)
-        except OSError:
-            pass
+    def _confident(self, text):
+        '''Return first standalone year which is not in the future.'''
+        for match in self.pattern.finditer(text):
+            if int(match.group()) <= self.latest:
+                return match.group()
+
+    def _stream(self, reader):
+        '''Read pages until a confident year match is found.'''
+        text = []
+        for page in reader.pages():
+            text.append(page)
+            value = self._confident(page)
+            if value:
+                reader.text = '\n'.join(text).strip()
+                message = 'PDF parser - Found PDF file {} year {} on page {}.'
+                logger.info(message.format(self.path, value, len(text)))
+                return value
+        reader.text = '\n'.join(text).strip()
+        return self._year(reader.text)
 
     # public methods
 
     def parse(self):
         '''Parse year from PDF file.'''
-        try:
-            cutter = PDFCutter(self.path, self.count, self.temp_dir)
+        with PDFCutter(self.path, self.count, self.temp_dir) as cutter:
+            try:
+                with timed(self.timings, 'cut'):
+                    cutter.cut()
+            except PdfReadError:
+                message = 'PDF parser - Failed to read PDF: {}'
+                logger.info(message.format(self.path))
+                self.count = None
+                return
+            try:
+                reader = PDFReader(cutter, self.ocr, self.timings)
+                if self.stream:
+                    year = self._stream(reader)
+                else:
+                    reader.read()
+                    year = self._year(reader.text)
+            except Exception as error:
+                message = 'PDF parser - Failed to parse PDF {}: {!r}'
+                logger.info(message.format(self.path, error))
+                self.count = None
+                return
+        self.count = cutter.original
+        self.length = len(reader.text or '')
+        self.extractor = reader.extractor
+        self.pages = reader.pages_read
+        self.year = year
+
+
+def check_pdf(path, count):
+    '''Return true if first PDF pages and their objects can be read.
+
+    Every object the first pages reference, including images and fonts,
+    is checked and the pages are written as the parser will, so missing
+    ranges of a partial file are found.
+    '''
+    try:
+        with PDFCutter(path, count, None) as cutter:
             cutter.cut()
-        except PdfReadError:
-            message = 'PDF parser - Failed to read PDF: {}'
-            logger.info(message.format(self.path))
-            self.count = None
+            cutter.verify()
+            cutter.buffer()
+            PDFReader(cutter, False).read()
+    except Exception:
+        return False
+    return True
+
+
+class PDFWorkerError(Exception):
+
+    '''PDF worker process crashed, timed out or raised.'''
+
+
+def parse_pdf(path, count, temp_dir, stream=False, ocr=True, profile=None):
+    '''Parse PDF and return results dictionary.
+
+    With sampler options in profile, the parse is profiled where it runs
+    and the collected data is returned with the results.
+    '''
+    parser = PDFParser(path, count, temp_dir, stream, ocr)
+    sampler = Sampler(*profile) if profile else None
+    with timed(parser.timings, 'parse'):
+        if sampler:
+            sampler.call(parser.parse)
+        else:
+            parser.parse()
+    result = parser.result
+    if sampler:
+        result['profile'] = sampler.report()
+    return result
+
+
+def _work(connection):
+    '''Run jobs received from the pool until told to stop.'''
+    while True:
+        try:
+            job = connection.recv()
+        except (EOFError, OSError):
+            return
+        if job is None:
             return
+        function, args = job
         try:
-            reader = PDFReader(cutter.path, self.count)
-            reader.read()
-        except (TypeError, KeyError):
-            message = 'PDF parser - Failed to parse PDF: {}'
-            logger.info(message.format(self.path))
-            self.count = None
+            connection.send((True, function(*args)))
+        except Exception as error:
+            connection.send((False, repr(error)))
+
+
+class PDFProcessPool(object):
+
+    '''Run PDF jobs in a pool of recyclable worker processes.'''
+
+    # constructor
+
+    def __init__(self, workers, timeout):
+        '''Set worker count and per job timeout.'''
+        self.workers = workers
+        self.timeout = timeout or None
+        self.context = multiprocessing.get_context('spawn')
+        self.idle = queue.Queue()
+
+    # private methods
+
+    def _spawn(self):
+        '''Start worker process and return it with its connection.'''
+        connection, child = self.context.Pipe()
+        process = self.context.Process(target=_work, args=(child,))
+        process.daemon = True
+        process.start()
+        child.close()
+        return process, connection
+
+    def _kill(self, process, connection):
+        '''Terminate worker process and close its connection.'''
+        connection.close()
+        if process.is_alive():
+            process.terminate()
+        process.join(1)
+
+    # public methods
+
+    def start(self):
+        '''Start worker processes.'''
+        for _ in range(self.workers):
+            self.idle.put(self._spawn())
+        message = 'PDF pool - Started {} worker processes.'
+        logger.info(message.format(self.workers))
+
+    def run(self, function, *args):
+        '''Run function in an idle worker and return result.
+
+        Blocks the calling thread. Crashed or hung workers are replaced
+        with new processes and the job fails with PDFWorkerError.
+        '''
+        process, connection = self.idle.get()
+        try:
+            connection.send((function, args))
+            if not connection.poll(self.timeout):
+                raise PDFWorkerError('Timed out after {}s.'.format(
+                    self.timeout
+                ))
+            success, value = connection.recv()
+        except (EOFError, OSError, PDFWorkerError) as error:
+            message = 'PDF pool - Recycling worker {}: {!r}'
+            logger.info(message.format(process.pid, error))
+            self._kill(process, connection)
+            self.idle.put(self._spawn())
+            raise PDFWorkerError(repr(error))
+        self.idle.put((process, connection))
+        if not success:
+            raise PDFWorkerError(value)
+        return value
+
+    def close(self):
+        '''Stop idle worker processes.'''
+        while True:
+            try:
+                process, connection = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+            process.join(5)
+            self._kill(process, connection)
+        logger.info('PDF pool - Stopped worker processes.')
+
+
+def store_path(fname, layout='flat'):
+    '''Return path of file name relative to files store for layout.'''
+    if layout == 'flat':
+        return 'full/{}'.format(fname)
+    if layout == 'sharded':
+        return 'full/{}/{}/{}'.format(fname[:2], fname[2:4], fname)
+    raise ValueError('Unknown files store layout: {}'.format(layout))
+
+
+class InputFile(object):
+
+    '''Input CSV file read lazily, optionally split into shards.'''
+
+    # class variables
+
+    shard_spec = re.compile(r'^\s*(\d+)\s*(?:/|of)\s*(\d+)\s*$')
+
+    # constructor
+
+    def __init__(self, path, shard='1/1', *args, **kwargs):
+        '''Set path and shard number and count.'''
+        super(InputFile, self).__init__(*args, **kwargs)
+        self.path = path
+        self.shard, self.shards = self._shard(shard)
+
+    # static methods
+
+    @staticmethod
+    def _shard(spec):
+        '''Return shard number and count from k/n or k of n spec.'''
+        match = InputFile.shard_spec.match(str(spec or '1/1'))
+        if not match:
+            raise ValueError('Invalid input shard: {}'.format(spec))
+        shard, shards = int(match.group(1)), int(match.group(2))
+        if not 1 <= shard <= shards:
+            raise ValueError('Invalid input shard: {}'.format(spec))
+        return shard, shards
+
+    # properties
+
+    @property
+    def name(self):
+        '''Return file name without extension with shard suffix.'''
+        name = os.path.splitext(os.path.basename(self.path))[0]
+        return '{}-{}of{}'.format(name, self.shard, self.shards)
+
+    @property
+    def signature(self):
+        '''Return size and modification time of file.'''
+        stat = os.stat(self.path)
+        return [stat.st_size, int(stat.st_mtime)]
+
+    # public methods
+
+    def rows(self, key=None):
+        '''Yield position within shard and row of every row of shard.'''
+        position = 0
+        with open(self.path, 'r', encoding='utf-8-sig') as file_:
+            for row in csv.DictReader(file_):
+                if self.shards > 1:
+                    value = key(row) if key else ','.join(
+                        str(i) for i in row.values()
+                    )
+                    checksum = zlib.crc32(value.encode('utf-8'))
+                    if checksum % self.shards != self.shard - 1:
+                        continue
+                yield position, row
+                position += 1
+
+
+class Checkpoint(object):
+
+    '''Input rows completed by a run saved to a JSON file.'''
+
+    # class variables
+
+    interval = 5
+
+    # constructor
+
+    def __init__(self, path, signature, *args, **kwargs):
+        '''Set checkpoint file and signature of input file.'''
+        super(Checkpoint, self).__init__(*args, **kwargs)
+        self.path = path
+        self.signature = signature
+        self.offset = 0
+        self.completed = set()
+        self.pending = {}
+        self.saved = 0
+
+    # public methods
+
+    def load(self, pending=False):
+        '''Read completed rows, and pending requests of queued rows.'''
+        try:
+            with open(self.path, 'r') as file_:
+                data = json.load(file_)
+        except (IOError, ValueError):
             return
-        if not self.path == cutter.path:
-            self._remove(cutter.path)
-        self.count = cutter.original
-        self.year = self._year(reader.text)
+        if data.get('signature') != self.signature:
+            message = 'Checkpoint - Input file changed, ignoring {}'
+            logger.warning(message.format(self.path))
+            return
+        self.offset = data.get('offset', 0)
+        self.completed = set(data.get('completed', []))
+        if pending:
+            self.pending = {
+                int(key): value
+                for key, value in data.get('pending', {}).items()
+            }
+        message = 'Checkpoint - Resuming after {} completed rows from {}'
+        logger.info(message.format(len(self), self.path))
+
+    def done(self, position):
+        '''Return true if row was completed.'''
+        return position < self.offset or position in self.completed
+
+    def schedule(self, position):
+        '''Count request scheduled for row.'''
+        self.pending[position] = self.pending.get(position, 0) + 1
+
+    def finish(self, position):
+        '''Count request of row done and return true if row completed.'''
+        count = self.pending.get(position, 0) - 1
+        if count > 0:
+            self.pending[position] = count
+            return False
+        self.pending.pop(position, None)
+        self.complete(position)
+        return True
+
+    def complete(self, position):
+        '''Mark row completed and save checkpoint every few seconds.'''
+        self.completed.add(position)
+        while self.offset in self.completed:
+            self.completed.remove(self.offset)
+            self.offset += 1
+        if time.time() - self.saved >= self.interval:
+            self.save()
+
+    def save(self):
+        '''Write row offset and completed rows past it.'''
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp = '{}.tmp'.format(self.path)
+        with open(temp, 'w') as file_:
+            json.dump({
+                'signature': self.signature, 'offset': self.offset,
+                'completed': sorted(self.completed),
+                'pending': self.pending
+            }, file_)
+        os.replace(temp, self.path)
+        self.saved = time.time()
+
+    def remove(self):
+        '''Delete checkpoint file.'''
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    # overriden class methods
+
+    def __len__(self):
+        '''Return number of completed rows.'''
+        return self.offset + len(self.completed)
 
 
 class BaseSpider(Spider):
 
+    # class variables
+
+    checkpoint = None
+    job = None
+    job_attributes = ()
+
     # static methods
 
     @staticmethod
     def _data(settings):
-        '''Return matrix from CSV file.'''
+        '''Return input file streaming rows of CSV file.'''
         input_dir = settings.get('INPUT_DIR')
         input_file = settings.get('INPUT_FILE')
         if not input_dir:
@@ -203,15 +731,83 @@ class BaseSpider(Spider):
         message = 'Base spider - Starting crawl for file: {}'
         logger.info(message.format(input_file))
         fname = os.path.join(input_dir, input_file)
-        try:
-            with open(fname, 'r', encoding='utf-8-sig') as file_:
-                reader = csv.DictReader(file_)
-                return list(reader)
-        except IOError:
+        if not os.access(fname, os.R_OK):
             raise NotConfigured('Error reading input data.')
+        try:
+            return InputFile(fname, settings.get('INPUT_SHARD'))
+        except ValueError as error:
+            raise NotConfigured(str(error))
 
     # private methods
 
+    def _shard_key(self, row):
+        '''Return value assigning row to an input shard.'''
+        return ','.join(str(i) for i in row.values())
+
+    def _resume(self):
+        '''Open job state and checkpoint and restore spider attributes.'''
+        settings = self.crawler.settings
+        self.job = JobState.from_settings(settings)
+        if self.job is not None:
+            self.job.open()
+            for name in self.job_attributes:
+                key = 'spider/{}/{}'.format(self.name, name)
+                value = self.job.setdefault(key, getattr(self, name))
+                if value != getattr(self, name):
+                    message = 'Base spider - Resuming job with {} = {}'
+                    self.logger.info(message.format(name, value))
+                    setattr(self, name, value)
+        if settings.getbool('CHECKPOINT_ENABLED'):
+            if self.job is not None:
+                path = os.path.join(settings.get('JOBDIR'), 'checkpoint.json')
+            else:
+                path = os.path.join(
+                    settings.get('CHECKPOINT_DIR'),
+                    '{}-{}.json'.format(self.name, self.data.name)
+                )
+            self.checkpoint = Checkpoint(path, self.data.signature)
+            self.checkpoint.load(self.job is not None)
+        self.crawler.signals.connect(
+            self.spider_closed, signal=signals.spider_closed
+        )
+
+    def _replay(self):
+        '''Yield requests replaying items left unfinished by the job.'''
+        if self.job is None:
+            return
+        entries = self.job.journal()
+        if entries:
+            message = 'Base spider - Replaying {} unfinished items.'
+            self.logger.info(message.format(len(entries)))
+        for cls, data in entries:
+            self.crawler.stats.inc_value('job/replayed', spider=self)
+            yield Request(
+                'data:,', callback=self._replayed, dont_filter=True,
+                meta={'item': (cls, data), 'dont_cache': True}
+            )
+
+    def _replayed(self, response):
+        '''Return unfinished item of replay request.'''
+        cls, data = response.meta['item']
+        return load_object(cls)(data)
+
+    def _rows(self):
+        '''Yield position and row of input rows not completed before.'''
+        checkpoint = self.checkpoint
+        stats = self.crawler.stats
+        for position, row in self.data.rows(self._shard_key):
+            stats.inc_value('input/rows', spider=self)
+            if checkpoint is not None and checkpoint.done(position):
+                stats.inc_value('input/skipped', spider=self)
+                continue
+            yield position, row
+
+    def _start(self):
+        '''Resume job and yield replay requests.'''
+        self._resume()
+        for request in self._replay():
+            yield request
+
     def _meta(self, row):
         '''Return request meta dictionary.'''
         return {
@@ -227,19 +823,167 @@ class BaseSpider(Spider):
         item['report_type'] = meta['report_type']
         return item
 
+    # public methods
+
+    def spider_closed(self, spider, reason):
+        '''Save or remove checkpoint and close job state on signal.'''
+        if self.job is not None:
+            self.job.close()
+        if self.checkpoint is None:
+            return
+        if reason == 'finished':
+            self.checkpoint.remove()
+            return
+        self.checkpoint.save()
+        message = 'Base spider - Saved checkpoint of {} completed rows: {}'
+        self.logger.info(message.format(
+            len(self.checkpoint), self.checkpoint.path
+        ))
+
 
 class SearchSpider(BaseSpider):
 
+    '''Send planned queries to one or more search APIs.'''
+
+    # constructor
+
+    def __init__(self, crawler, data, depth, engines, *args, **kwargs):
+        '''Set crawler, input file, depth and search engines.'''
+        super(SearchSpider, self).__init__(*args, **kwargs)
+        self.crawler = crawler
+        self.data = data
+        self.depth = depth
+        self.engines = OrderedDict((i.name, i) for i in engines)
+
     # private methods
 
+    def _url(self, engine, row):
+        '''Return url of first results page of row query for engine.'''
+        return engine.url(self._query(row), row)
+
+    def _plan(self, rows):
+        '''Return unique engine queries with position and meta of rows.'''
+        plan = OrderedDict()
+        count = 0
+        for position, row in rows:
+            meta = self._meta(row)
+            for engine in self.engines.values():
+                key = (engine.name, self._url(engine, row))
+                plan.setdefault(key, []).append((position, meta))
+            count += 1
+        message = 'Search spider - Planned {} queries for {} input rows.'
+        self.logger.info(message.format(len(plan), count))
+        self.crawler.stats.inc_value('search/rows', count, spider=self)
+        self.crawler.stats.inc_value('search/queries', len(plan), spider=self)
+        return plan
+
+    def _first(self, key, rows):
+        '''Return request for first results page of engine query.'''
+        name, url = key
+        meta = {
+            'rows': [meta for _, meta in rows],
+            'input_rows': [position for position, _ in rows],
+            'engine': name, 'base': url, 'page': 0
+        }
+        engine = self.engines[name]
+        return self._api_request(engine.page_url(url, 0), meta)
+
+    def _api_request(self, url, meta):
+        '''Return search API request and count calls saved by planning.'''
+        saved = len(meta['rows']) - 1
+        if saved:
+            self.crawler.stats.inc_value(
+                'search/calls_saved', saved, spider=self
+            )
+        engine = self.engines[meta['engine']]
+        meta['metrics_stage'] = 'api'
+        return engine.request(url, meta, self.parse)
+
+    def _items(self, item, meta):
+        '''Yield copy of result item for every row sharing the query.'''
+        for row in meta['rows']:
+            yield self._process_meta(item.copy(), row)
+
+    def _pages(self, response, data, count):
+        '''Return requests for remaining results pages of query.'''
+        meta = response.meta
+        engine = self.engines[meta['engine']]
+        if meta['page']:
+            return []
+        if count < engine.page_size:
+            message = 'Search spider - Last page reached for url: {}'
+            self.logger.info(message.format(response.url))
+            return []
+        total = engine.total(data)
+        if engine.max_results:
+            total = min(total, engine.max_results)
+        pages = min(self.depth, -(-total // engine.page_size))
+        message = 'Search spider - Requesting {} more pages for url: {}'
+        self.logger.info(message.format(max(0, pages - 1), response.url))
+        requests = []
+        for page in range(1, pages):
+            page_meta = {
+                'rows': meta['rows'], 'input_rows': meta['input_rows'],
+                'engine': meta['engine'], 'base': meta['base'], 'page': page
+            }
+            url = engine.page_url(meta['base'], page)
+            requests.append(self._api_request(url, page_meta))
+        return requests
+
+    def _shard_key(self, row):
+        '''Return search query so rows sharing it land in one shard.'''
+        return self._query(row)
+
     def _query(self, row):
-        '''Return search query.'''
+        '''Return normalized search query.'''
         site = row.get('site')
         if site:
             extract = tldextract.extract(site)
             site = 'site:{}.{}'.format(extract.domain, extract.suffix)
         query = [row.get('keyword'), row.get('modifier'), site, 'filetype:pdf']
-        return ' '.join([i for i in query if i])
+        return ' '.join(' '.join([i for i in query if i]).lower().split())
+
+    # class method overrides
+
+    def start_requests(self):
+        '''Dispatch one request per unique query of each input batch.'''
+        for request in self._start():
+            yield request
+        batch = self.crawler.settings.getint('INPUT_BATCH') or None
+        rows = self._rows()
+        while True:
+            chunk = list(itertools.islice(rows, batch))
+            if not chunk:
+                break
+            for key, entries in self._plan(chunk).items():
+                yield self._first(key, entries)
+
+    def parse(self, response):
+        '''Parse search results.'''
+        engine = self.engines[response.meta['engine']]
+        data = json.loads(response.body_as_unicode())
+        results = engine.results(data)
+        message = 'Search spider - Found {} {} results for url: {}'
+        self.logger.info(message.format(
+            len(results), engine.name, response.url
+        ))
+        self.crawler.stats.inc_value(
+            'search/results/{}'.format(engine.name), len(results),
+            spider=self
+        )
+        for node in results:
+            item = engine.item(node)
+            item['engine'] = engine.name
+            item['keyword'] = engine.keyword(data)
+            item['total'] = engine.total(data)
+            item['file_urls'] = [item['url']]
+            for row_item in self._items(item, response.meta):
+                yield row_item
+
+        # request remaining results pages of query
+
+        for request in self._pages(response, data, len(results)):
+            yield request
 
 
 class CustomSettings(object):
@@ -261,14 +1005,21 @@ class CustomSettings(object):
         if not self.download_enabled:
             logger.info('Custom settings - PDF Download disabled.')
             return {
+                'pension_crawler.pipelines.HistoryPipeline': 290,
+                'pension_crawler.pipelines.ResultsPipeline': 295,
                 'pension_crawler.pipelines.CSVPipeline': 300,
+                'pension_crawler.pipelines.OutputPipeline': 310
             }
         logger.info('Custom settings - PDF Download enabled.')
         return {
-            'scrapy.pipelines.files.FilesPipeline': 1,
+            'pension_crawler.pipelines.FilesPipeline': 1,
             'pension_crawler.pipelines.PDFPipeline': 300,
+            'pension_crawler.pipelines.OCRPipeline': 305,
             'pension_crawler.pipelines.IsDownloadedPipeline': 310,
-            'pension_crawler.pipelines.CSVPipeline': 320
+            'pension_crawler.pipelines.HistoryPipeline': 315,
+            'pension_crawler.pipelines.ResultsPipeline': 318,
+            'pension_crawler.pipelines.CSVPipeline': 320,
+            'pension_crawler.pipelines.OutputPipeline': 330
         }
 
     @property
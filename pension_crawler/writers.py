@@ -0,0 +1,215 @@
+'''writers.py'''
+
+import csv
+import json
+import logging
+import os
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+# logging
+
+logger = logging.getLogger(__name__)
+
+
+# typed output columns, all other columns are text
+
+TYPES = {
+    'year': 'int',
+    'page_count': 'int',
+    'total': 'int',
+    'downloaded': 'bool'
+}
+
+
+def typed(row):
+    '''Return row with typed columns converted, empty values as none.'''
+    result = {}
+    for key, value in row.items():
+        if value == '' or value is None:
+            result[key] = None
+            continue
+        kind = TYPES.get(key)
+        try:
+            if kind == 'int':
+                value = int(value)
+            elif kind == 'bool':
+                value = value in (True, 'True', 'true', '1', 1)
+            else:
+                value = str(value)
+        except (TypeError, ValueError):
+            value = None
+        result[key] = value
+    return result
+
+
+class BatchWriter(object):
+
+    '''Common functionality for output files written in batches.'''
+
+    # class variables
+
+    extension = None
+    appendable = True
+
+    # constructor
+
+    def __init__(self, path, fields, *args, **kwargs):
+        '''Set output file path and columns.'''
+        self.path = '{}.{}'.format(path, self.extension)
+        self.fields = fields
+        self.file_ = None
+
+    # public methods
+
+    def open(self, append=False):
+        '''Open output file.'''
+        raise NotImplementedError
+
+    def write(self, rows):
+        '''Write batch of typed rows.'''
+        raise NotImplementedError
+
+    def close(self):
+        '''Close output file.'''
+        if self.file_ is None:
+            return
+        self.file_.close()
+        self.file_ = None
+
+
+class CSVWriter(BatchWriter):
+
+    '''CSV output file.'''
+
+    # class variables
+
+    extension = 'csv'
+
+    # public methods
+
+    def open(self, append=False):
+        '''Open output file and write header unless appending.'''
+        append = append and os.path.exists(self.path)
+        self.file_ = open(
+            self.path, 'a' if append else 'w', newline='', encoding='utf-8'
+        )
+        self.writer = csv.DictWriter(
+            self.file_, self.fields, extrasaction='ignore'
+        )
+        if not append:
+            self.writer.writeheader()
+
+    def write(self, rows):
+        '''Write batch of typed rows.'''
+        self.writer.writerows(rows)
+        self.file_.flush()
+
+
+class JSONLinesWriter(BatchWriter):
+
+    '''JSON Lines output file.'''
+
+    # class variables
+
+    extension = 'jsonl'
+
+    # public methods
+
+    def open(self, append=False):
+        '''Open output file.'''
+        self.file_ = open(self.path, 'a' if append else 'w', encoding='utf-8')
+
+    def write(self, rows):
+        '''Write batch of typed rows.'''
+        self.file_.write(''.join(
+            '{}\n'.format(json.dumps(
+                {key: row.get(key) for key in self.fields}
+            )) for row in rows
+        ))
+        self.file_.flush()
+
+
+class ArrowWriter(BatchWriter):
+
+    '''Arrow IPC output file with one record batch per write.'''
+
+    # class variables
+
+    extension = 'arrow'
+    appendable = False
+
+    # constructor
+
+    def __init__(self, path, fields, *args, **kwargs):
+        '''Set output file path, columns and schema.'''
+        super(ArrowWriter, self).__init__(path, fields, *args, **kwargs)
+        self.schema = self._schema(fields)
+        self.writer = None
+
+    # static methods
+
+    @staticmethod
+    def _schema(fields):
+        '''Return Arrow schema of columns.'''
+        kinds = {'int': pyarrow.int64(), 'bool': pyarrow.bool_()}
+        return pyarrow.schema([
+            pyarrow.field(key, kinds.get(TYPES.get(key), pyarrow.string()))
+            for key in fields
+        ])
+
+    # private methods
+
+    def _table(self, rows):
+        '''Return Arrow table of rows.'''
+        return pyarrow.Table.from_arrays([
+            pyarrow.array([row.get(i.name) for row in rows], type=i.type)
+            for i in self.schema
+        ], schema=self.schema)
+
+    # public methods
+
+    def open(self, append=False):
+        '''Open output file.'''
+        self.file_ = pyarrow.OSFile(self.path, 'wb')
+        self.writer = pyarrow.ipc.new_file(self.file_, self.schema)
+
+    def write(self, rows):
+        '''Write batch of typed rows.'''
+        self.writer.write_table(self._table(rows))
+
+    def close(self):
+        '''Finish and close output file.'''
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        super(ArrowWriter, self).close()
+
+
+class ParquetWriter(ArrowWriter):
+
+    '''Parquet output file with one row group per write.'''
+
+    # class variables
+
+    extension = 'parquet'
+
+    # public methods
+
+    def open(self, append=False):
+        '''Open output file.'''
+        self.writer = pyarrow.parquet.ParquetWriter(self.path, self.schema)
+
+
+WRITERS = {
+    'csv': CSVWriter,
+    'jsonl': JSONLinesWriter,
+    'arrow': ArrowWriter,
+    'parquet': ParquetWriter
+}